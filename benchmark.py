@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import optimization_e_constraint_method as ecm
+import optimization_ref_point_method as rpm
+from instrumentation import Stats
+
+"""
+Benchmarks for the epsilon constraint and reference point methods.
+
+Both methods are solved for the companies of final_data.csv and for synthetic
+universes of different sizes. Wall time, function evaluations and quality of
+the solution, and optionally peak memory, are recorded for each run into a JSON
+file, which can be given as baseline for later runs to compare against.
+
+Usage:
+    python benchmark.py --output benchmark_results.json
+    python benchmark.py --baseline benchmark_results.json --output new.json
+    python benchmark.py --memory --output memory.json
+
+"""
+
+SIZES = [30, 100, 1000, 10000]
+# nonlinear solvers are slow for large universes, run them only up to this size
+MAX_SLSQP = 100
+
+# bounds for e-constraint method when p/e ratio is optimized, and reference point
+BOUNDS = [0.09, 0.6, 2, 1]
+REF = [0.1, 0.5, 3, 1, 15]
+B_TOL = 0.1
+
+
+def synthetic_universe(data, n, seed=0):
+    """
+    Generate a synthetic universe of companies by resampling real companies.
+
+    Numeric values of resampled companies are perturbed slightly, so that the
+    synthetic companies are not exact copies.
+
+    Parameters
+    ----------
+    data : DataFrame
+        company data, in the format of final_data.csv.
+    n : int
+        number of companies.
+    seed : int
+        seed for random number generator.
+
+    Returns
+    -------
+    DataFrame
+        synthetic company data.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    frame = data.iloc[rng.integers(0, len(data), n)].reset_index(drop=True)
+    frame['Company'] = ['Synthetic ' + str(i) for i in range(n)]
+    for col in ['Beta', 'Dividend yield', 'P/E', 'Expected return', 'ESG score']:
+        frame[col] = frame[col]*rng.lognormal(0, 0.05, n)
+    return frame
+
+
+def measure(fun, memory=False):
+    """
+    Run a function, measuring wall time and optionally peak memory. Output is 
+    suppressed.
+    
+    Tracing allocations slows down the run several times, so peak memory is 
+    measured in a second run of the function, not in the timed one.
+
+    Parameters
+    ----------
+    fun : function
+        function without arguments.
+    memory : bool
+        measure peak memory in a second run.
+
+    Returns
+    -------
+    result :
+        return value of the timed run.
+    wall_time : float
+        seconds.
+    peak_memory : int or None
+        peak of memory allocated during the second run, in bytes, None if not 
+        measured.
+
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = fun()
+        wall_time = time.perf_counter()-start
+        peak_memory = None
+        if memory:
+            tracemalloc.start()
+            try:
+                fun()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return result, wall_time, peak_memory
+
+
+def run_e_constraint(data, backend, memory=False):
+    """
+    Benchmark epsilon constraint method, p/e ratio optimized.
+    """
+
+    names, p = ecm.params(data)
+
+    def solve():
+        stats = Stats()
+        return ecm.solve_problem(p, names, 4, BOUNDS, B_TOL, backend=backend,
+                                 stats=stats), stats
+
+    ((x, used), stats), wall_time, peak_memory = measure(solve, memory)
+    quality = {'feasible': x is not None}
+    if x is not None:
+        values = ecm.lp_form(p)['values']
+        quality.update({'objectives': (x @ values).tolist(),
+                        'beta': float(x @ np.asarray(p[1], dtype=float)),
+                        'sum_of_weights': float(np.sum(x))})
+    return {'config': {'backend': used},
+            'wall_time': wall_time,
+            'peak_memory': peak_memory,
+            'evaluations': None,
+            'stats': stats.as_dict(),
+            'quality': quality}
+
+
+def run_ref_point(data, ideal_method, asf_method, memory=False):
+    """
+    Benchmark reference point method, solved for all companies in data.
+    """
+
+    rpm.set_data(data)
+    n = len(data)
+
+    res, wall_time, peak_memory = measure(
+        lambda: rpm.solve_problem(rpm.f, [1/n]*n, REF, B_TOL, ideal_method=ideal_method,
+                                  asf_method=asf_method), memory)
+    betas = rpm.beta_vector[:n]
+    return {'config': {'ideal_method': ideal_method, 'asf_method': asf_method},
+            'wall_time': wall_time,
+            'peak_memory': peak_memory,
+            'evaluations': dict(res.stats.counts),
+            'stats': res.stats.as_dict(),
+            'quality': {'success': bool(res.success),
+                        'asf': float(res.fun),
+                        'objectives': rpm.f(res.x).tolist(),
+                        'beta': float(betas @ res.x),
+                        'sum_of_weights': float(np.sum(res.x))}}
+
+
+def warm_up(data, memory=False):
+    """
+    Run both methods once before the timed runs.
+    
+    The first run of a method in a process includes one-time costs: importing 
+    pyomo and scipy, and probing installed solvers in select_backend. They are 
+    recorded as separate results, universe 'cold_start', instead of being 
+    included in the time of the first timed run.
+
+    Parameters
+    ----------
+    data : DataFrame
+        company data, in the format of final_data.csv.
+    memory : bool
+        measure peak memory, see measure.
+
+    Returns
+    -------
+    list
+        results of the cold runs.
+
+    """
+
+    results = []
+    runs = [('e_constraint', lambda: run_e_constraint(data, 'auto', memory)),
+            ('ref_point', lambda: run_ref_point(data, 'lp', 'lp', memory))]
+    for method, r in runs:
+        result = {'method': method, 'universe': 'cold_start', 'n': len(data)}
+        result.update(r())
+        print(method, 'cold start', round(result['wall_time'], 3), 's')
+        results.append(result)
+    return results
+
+
+def run(sizes=SIZES, max_slsqp=MAX_SLSQP, seed=0, memory=False):
+    """
+    Run benchmarks for final_data.csv and synthetic universes.
+    
+    Runs are timed after warm_up, so that one-time start-up costs are 
+    recorded separately.
+
+    Parameters
+    ----------
+    sizes : list
+        sizes of synthetic universes.
+    max_slsqp : int
+        largest universe for which nonlinear (slsqp) solvers are run.
+    seed : int
+        seed for generating synthetic universes.
+    memory : bool
+        measure peak memory of each run, in a separate untimed run.
+
+    Returns
+    -------
+    list
+        results of each run.
+
+    """
+
+    path = rpm.DATA_PATH
+    data = pd.read_csv(path, index_col=0)
+    universes = [('final_data', data)]
+    universes += [('synthetic', synthetic_universe(data, n, seed)) for n in sizes]
+
+    results = warm_up(data, memory)
+    for universe, frame in universes:
+        n = len(frame)
+        runs = [lambda: run_e_constraint(frame, 'auto', memory),
+                lambda: run_ref_point(frame, 'lp', 'lp', memory)]
+        if n <= max_slsqp:
+            runs.append(lambda: run_ref_point(frame, 'slsqp', 'slsqp', memory))
+        for method, r in zip(['e_constraint', 'ref_point', 'ref_point'], runs):
+            result = {'method': method, 'universe': universe, 'n': n}
+            result.update(r())
+            print(method, universe, n, result['config'],
+                  round(result['wall_time'], 3), 's')
+            results.append(result)
+    # restore the default data
+    rpm.set_data(data, path)
+    return results
+
+
+def _key(result):
+    """
+    Key identifying a benchmark run, for comparing against baseline.
+    """
+
+    return (result['method'], result['universe'], result['n'],
+            json.dumps(result['config'], sort_keys=True))
+
+
+def compare(results, baseline):
+    """
+    Print wall times of results relative to baseline.
+
+    Parameters
+    ----------
+    results : list
+        results of run.
+    baseline : list
+        results of an earlier run.
+
+    """
+
+    base = {_key(b): b for b in baseline}
+    print("\nCompared to baseline (time, time/baseline):")
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        print(r['method'], r['universe'], r['n'], r['config'],
+              round(r['wall_time'], 3), round(r['wall_time']/b['wall_time'], 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the epsilon constraint and reference point methods.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='sizes of synthetic universes')
+    parser.add_argument('--max-slsqp', type=int, default=MAX_SLSQP,
+                        help='largest universe solved with slsqp')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true',
+                        help='measure peak memory, in a second untimed run of each solve')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.max_slsqp, args.seed, args.memory)
+    with open(args.output, 'w') as file:
+        json.dump({'python': platform.python_version(),
+                   'numpy': np.__version__,
+                   'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(results, json.load(file)['results'])
+
+
+if __name__ == '__main__':
+    main()
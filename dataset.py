@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import numpy as np
+from payoff_cache import fingerprint
+
+"""
+Binary format of company data.
+
+Company data (final_data.csv) is compiled once into a binary format: numeric
+columns are stored as one column-contiguous float array, text columns (e.g.
+names of companies) separately as a fixed-width string array, and a small JSON
+header records the format version, columns and hash of the source file. Arrays
+are loaded memory mapped, so loading takes the same time for any number of
+companies, and worker processes share the pages of the same files instead of
+each holding a copy of the data.
+
+The binary is rebuilt when the source file changes. Loaded datasets are cached
+within the process.
+
+Example:
+    data = load('data/final_data.csv')
+    betas = data['Beta']
+    names = data['Company']
+
+"""
+
+VERSION = 1
+CACHE_DIR = 'data/cache'
+
+# loaded datasets, keyed by paths and modification time and size of source file
+_loaded = {}
+
+
+class Dataset:
+    """
+    Company data loaded from the binary format.
+
+    Columns are accessed by name as with a DataFrame, data['Beta'] giving an
+    array of the column. Numeric columns are read-only views to the memory
+    mapped array.
+
+    Parameters
+    ----------
+    header : dict
+        header of the binary.
+    values : np.array
+        n x k array of numeric columns, in column-major order.
+    text : np.array
+        n x m array of text columns, in column-major order.
+
+    """
+
+    def __init__(self, header, values, text):
+        self.header = header
+        self.values = values
+        self.text = text
+        self._numeric = {c: j for j, c in enumerate(header['numeric'])}
+        self._text = {c: j for j, c in enumerate(header['text'])}
+
+    @property
+    def columns(self):
+        """
+        Names of columns, in order of source file.
+        """
+
+        return list(self.header['columns'])
+
+    def __len__(self):
+        return self.header['rows']
+
+    def __contains__(self, column):
+        return column in self._numeric or column in self._text
+
+    def __getitem__(self, column):
+        if column in self._numeric:
+            return self.values[:, self._numeric[column]]
+        if column in self._text:
+            return self.text[:, self._text[column]]
+        raise KeyError(column)
+
+    def frame(self):
+        """
+        Data as a DataFrame, copied to memory.
+
+        Missing values of text columns are empty strings.
+
+        Returns
+        -------
+        DataFrame
+            company data, columns in order of source file.
+
+        """
+
+        import pandas as pd
+        return pd.DataFrame({c: np.array(self[c]) for c in self.columns})
+
+    def __repr__(self):
+        return 'Dataset(' + self.header['source'] + ', ' + str(len(self)) + ' rows)'
+
+
+def _tag(path):
+    """
+    Short tag identifying a source file by its location.
+    """
+
+    return hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:12]
+
+
+def _paths(csv_path, cache_dir, digest=None):
+    """
+    Paths of header, and of numeric and text arrays for given hash of source file.
+    """
+
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    tag = _tag(csv_path)
+    header = os.path.join(cache_dir, name + '_' + tag + '.json')
+    if digest is None:
+        return header
+    stem = os.path.join(cache_dir, name + '_' + tag + '_' + digest[:16])
+    return header, stem + '.values.npy', stem + '.text.npy'
+
+
+def build(csv_path, cache_dir=CACHE_DIR):
+    """
+    Compile a csv file of company data into the binary format.
+
+    Parameters
+    ----------
+    csv_path : str
+        path to data file, in the format of final_data.csv.
+    cache_dir : str
+        directory of binaries.
+
+    Returns
+    -------
+    dict
+        header of the binary.
+
+    """
+
+    import pandas as pd
+
+    stat = os.stat(csv_path)
+    digest = fingerprint(csv_path)
+    frame = pd.read_csv(csv_path, index_col=0)
+    numeric = [c for c in frame.columns if pd.api.types.is_numeric_dtype(frame[c])]
+    text = [c for c in frame.columns if c not in numeric]
+
+    header_path, values_path, text_path = _paths(csv_path, cache_dir, digest)
+    os.makedirs(cache_dir, exist_ok=True)
+    # arrays are written first and the header last, each to a temporary file
+    # first, so that readers never see a partial binary
+    values = np.asfortranarray(frame[numeric].to_numpy(dtype=float))
+    strings = np.asfortranarray(frame[text].fillna('').astype(str).to_numpy(dtype=str))
+    for path, array in ((values_path, values), (text_path, strings)):
+        tmp = path + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as file:
+            np.save(file, array)
+        os.replace(tmp, path)
+
+    header = {'version': VERSION,
+              'source': os.path.abspath(csv_path),
+              'sha256': digest,
+              'size': stat.st_size,
+              'mtime_ns': stat.st_mtime_ns,
+              'rows': len(frame),
+              'columns': list(frame.columns),
+              'numeric': numeric,
+              'text': text,
+              'values': os.path.basename(values_path),
+              'strings': os.path.basename(text_path)}
+    tmp = header_path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(header, file)
+    os.replace(tmp, header_path)
+
+    # arrays of previous contents of the source file. Another process may
+    # still have them memory mapped, and on Windows mapped files can not be
+    # removed: those are left in place and removed by a later build
+    prefix = os.path.basename(header_path)[:-len('.json')] + '_'
+    for e in os.listdir(cache_dir):
+        if (e.startswith(prefix) and e.endswith('.npy')
+                and e not in (header['values'], header['strings'])):
+            try:
+                os.remove(os.path.join(cache_dir, e))
+            except OSError:
+                pass
+    return header
+
+
+def _read_header(csv_path, cache_dir):
+    """
+    Header of the binary of a csv file, None if missing or out of date.
+    """
+
+    header_path = _paths(csv_path, cache_dir)
+    try:
+        with open(header_path, encoding='utf-8') as file:
+            header = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != VERSION:
+        return None
+
+    # contents are hashed only if the file has been touched
+    stat = os.stat(csv_path)
+    if (header['size'], header['mtime_ns']) != (stat.st_size, stat.st_mtime_ns):
+        if header['sha256'] != fingerprint(csv_path):
+            return None
+    for name in (header['values'], header['strings']):
+        if not os.path.exists(os.path.join(cache_dir, name)):
+            return None
+    return header
+
+
+def load(csv_path='data/final_data.csv', cache_dir=CACHE_DIR):
+    """
+    Load company data, compiling the csv file into the binary format if it has changed.
+
+    Parameters
+    ----------
+    csv_path : str
+        path to data file, in the format of final_data.csv.
+    cache_dir : str
+        directory of binaries.
+
+    Returns
+    -------
+    Dataset
+        company data, arrays memory mapped.
+
+    """
+
+    stat = os.stat(csv_path)
+    key = (os.path.abspath(csv_path), os.path.abspath(cache_dir),
+           stat.st_mtime_ns, stat.st_size)
+    if key in _loaded:
+        return _loaded[key]
+
+    header = _read_header(csv_path, cache_dir)
+    if header is None:
+        header = build(csv_path, cache_dir)
+    values = np.load(os.path.join(cache_dir, header['values']), mmap_mode='r')
+    text = np.load(os.path.join(cache_dir, header['strings']), mmap_mode='r')
+    data = Dataset(header, values, text)
+    _loaded[key] = data
+    return data
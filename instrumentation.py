@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import cProfile
+import pstats
+import sys
+import time
+
+"""
+Instrumentation of the solvers.
+
+A Stats object collects wall time of each phase of a solve (e.g. calculation of
+ideal vector, solving achievement scalarizing function), counts of objective and
+constraint function evaluations and iteration counts reported by the solvers.
+Phases can be profiled with cProfile, and a callback can be called after each phase.
+
+Example:
+    stats = Stats(profile=['asf'])
+    res = solve_problem(f,x0,ref,tol,stats=stats)
+    print(res.stats.as_dict())
+    res.stats.profile_stats('asf').sort_stats('cumulative').print_stats(10)
+
+"""
+
+
+class Stats:
+    """
+    Timers, evaluation counts and solver iteration counts of a solve.
+
+    Parameters
+    ----------
+    profile : bool or list, optional
+        profile all phases with cProfile if True, or the phases named in list.
+    callback : function, optional
+        called as callback(phase, seconds) after each phase.
+
+    Attributes
+    ----------
+    timers : dict
+        total wall time of each phase, in seconds.
+    counts : dict
+        number of evaluations of each function.
+    iterations : dict
+        number of solver iterations in each phase.
+    profiles : dict
+        cProfile.Profile objects of each profiled phase, see profile_stats.
+
+    """
+
+    def __init__(self, profile=None, callback=None):
+        self.timers = {}
+        self.counts = {}
+        self.iterations = {}
+        self.profiles = {}
+        self.profile = profile
+        self.callback = callback
+
+    def _profiled(self, name):
+        """
+        Check whether a phase is profiled.
+        """
+
+        if self.profile is True:
+            return True
+        return bool(self.profile) and name in self.profile
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager timing a phase, and profiling it when requested.
+
+        Parameters
+        ----------
+        name : str
+            name of phase.
+
+        """
+
+        profiler = cProfile.Profile() if self._profiled(name) else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profiles.setdefault(name, []).append(profiler)
+            elapsed = time.perf_counter()-start
+            self.timers[name] = self.timers.get(name, 0)+elapsed
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    def profile_stats(self, name, stream=None):
+        """
+        Profiling statistics of a phase.
+
+        Parameters
+        ----------
+        name : str
+            name of profiled phase.
+        stream : file, optional
+            stream statistics are printed to, by default sys.stdout.
+
+        Returns
+        -------
+        pstats.Stats
+            statistics of all runs of the phase.
+
+        """
+
+        return pstats.Stats(*self.profiles[name], stream=stream or sys.stdout)
+
+    def count(self, name, k=1):
+        """
+        Add to count of evaluations.
+
+        Parameters
+        ----------
+        name : str
+            name of counted function.
+        k : int
+            number of evaluations.
+
+        """
+
+        self.counts[name] = self.counts.get(name, 0)+k
+
+    def add_iterations(self, name, k):
+        """
+        Add to count of solver iterations.
+
+        Parameters
+        ----------
+        name : str
+            name of phase.
+        k : int
+            number of iterations, ignored if None.
+
+        """
+
+        if k is not None:
+            self.iterations[name] = self.iterations.get(name, 0)+int(k)
+
+    def counted(self, fun, name):
+        """
+        Wrap a function so that its evaluations are counted.
+
+        Parameters
+        ----------
+        fun : function
+            function to be counted.
+        name : str
+            name of counted function.
+
+        Returns
+        -------
+        function
+            wrapped function.
+
+        """
+
+        def wrapper(*args, **kwargs):
+            self.count(name)
+            return fun(*args, **kwargs)
+        return wrapper
+
+    def as_dict(self):
+        """
+        Timers and counts as a dictionary, e.g. for storing as JSON.
+        """
+
+        return {'timers': dict(self.timers),
+                'counts': dict(self.counts),
+                'iterations': dict(self.iterations)}
+
+    def __repr__(self):
+        return 'Stats(' + repr(self.as_dict()) + ')'
+
+
+def phase(stats, name):
+    """
+    Time a phase with stats, or do nothing if stats is None.
+
+    Parameters
+    ----------
+    stats : Stats or None
+        stats of the solve.
+    name : str
+        name of phase.
+
+    Returns
+    -------
+    context manager.
+
+    """
+
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
+
+
+def counted(stats, fun, name):
+    """
+    Count evaluations of a function with stats, or return it as is if stats is None.
+    """
+
+    if stats is None:
+        return fun
+    return stats.counted(fun, name)
+
+
+def counted_constraints(stats, constraints):
+    """
+    Count evaluations of constraint functions and their Jacobians, in form
+    accepted by scipy.optimize.minimize.
+    """
+
+    if stats is None:
+        return constraints
+    return tuple(dict(c, fun=stats.counted(c['fun'], 'constraint'),
+                      **({'jac': stats.counted(c['jac'], 'constraint jacobian')}
+                         if 'jac' in c else {}))
+                 for c in constraints)
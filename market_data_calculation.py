@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import csv
+import json
+import os
+import time
 import numpy as np
 import pandas as pd
-import yfinance as yf
 
 """
 Created on Mon Apr  6 13:29:30 2020
@@ -18,6 +22,189 @@ Data sources:
 
 """
 
+# fundamentals fetched for each ticker, column name and key in Yahoo Finance info
+FUNDAMENTALS = {'Beta': 'beta',
+                'Dividend yield': 'fiveYearAvgDividendYield',
+                'P/E': 'trailingPE'}
+FUNDAMENTALS_CACHE = 'data/cache/fundamentals.json'
+# fetched fundamentals are used for a day
+FUNDAMENTALS_TTL = 24*60*60
+
+
+def yahoo_info(symbol):
+    """
+    Get metadata of a stock from Yahoo Finance, using yfinance.
+
+    Parameters
+    ----------
+    symbol : str
+        stock symbol.
+
+    Returns
+    -------
+    dict
+        metadata of the stock, including fundamentals.
+
+    """
+    
+    import yfinance as yf
+    return yf.Ticker(symbol).info
+
+
+def read_cache(path=FUNDAMENTALS_CACHE):
+    """
+    Read cached fundamentals.
+
+    Parameters
+    ----------
+    path : str
+        path to cache file.
+
+    Returns
+    -------
+    dict
+        fundamentals and time of fetch of each symbol, empty if there is no cache.
+
+    """
+    
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache(cache, path=FUNDAMENTALS_CACHE):
+    """
+    Write fundamentals to cache file.
+
+    Parameters
+    ----------
+    cache : dict
+        fundamentals and time of fetch of each symbol.
+    path : str
+        path to cache file.
+
+    """
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # write to a temporary file first, so that readers never see a partial file
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(cache, file)
+    os.replace(tmp, path)
+
+
+def fetch_one(symbol, fetch=yahoo_info):
+    """
+    Fetch all fundamentals of a stock with a single request.
+
+    Parameters
+    ----------
+    symbol : str
+        stock symbol.
+    fetch : function
+        returns metadata of a stock, see yahoo_info.
+
+    Returns
+    -------
+    dict or None
+        fundamentals and time of fetch, None if the request failed. 
+        Fundamentals not found are None.
+
+    """
+    
+    try:
+        info = fetch(symbol)
+    except Exception as e:
+        print("Data not found for " + symbol + ": " + str(e))
+        return None
+    entry = {'time': time.time()}
+    for column, key in FUNDAMENTALS.items():
+        entry[column] = info.get(key)
+        if entry[column] is None:
+            print(column + " not found for " + symbol)
+    return entry
+
+
+def stale_symbols(cache, s, ttl=FUNDAMENTALS_TTL, now=None):
+    """
+    Symbols whose fundamentals have to be fetched: new symbols, symbols fetched 
+    longer than ttl ago and symbols with fundamentals missing in the last fetch.
+
+    Parameters
+    ----------
+    cache : dict
+        fundamentals and time of fetch of each symbol, see read_cache.
+    s : list
+        stock symbols.
+    ttl : float
+        time to live of cached fundamentals, in seconds.
+    now : float, optional
+        current time, by default time.time().
+
+    Returns
+    -------
+    list
+        unique symbols to be fetched, in order of s.
+
+    """
+    
+    now = time.time() if now is None else now
+    stale = []
+    for i in dict.fromkeys(s):
+        entry = cache.get(i)
+        if (entry is None or now-entry['time'] > ttl 
+            or any(entry.get(column) is None for column in FUNDAMENTALS)):
+            stale.append(i)
+    return stale
+
+
+def fetch_fundamentals(s, fetch=yahoo_info, workers=8, cache_path=FUNDAMENTALS_CACHE,
+                       ttl=FUNDAMENTALS_TTL):
+    """
+    Get beta, 5 year average dividend yield and trailing p/e ratio of stocks.
+    
+    Each stock is fetched once, with at most workers requests running concurrently. 
+    Fetched fundamentals are cached to a file with time of fetch, and used instead 
+    of fetching again until they are older than ttl, see stale_symbols.
+
+    Parameters
+    ----------
+    s : list
+        stock symbols.
+    fetch : function
+        returns metadata of a stock as a dict, by default from Yahoo Finance.
+        Can be replaced e.g. with a local stand-in in tests.
+    workers : int
+        maximum number of concurrent requests.
+    cache_path : str or None
+        path to cache file, None for not caching.
+    ttl : float
+        time to live of cached fundamentals, in seconds.
+
+    Returns
+    -------
+    DataFrame
+        beta, dividend yield and p/e ratio of each stock, indexed by symbol.
+        Missing values are NaN.
+
+    """
+    
+    cache = read_cache(cache_path) if cache_path else {}
+    stale = stale_symbols(cache, s, ttl)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, entry in zip(stale, pool.map(lambda i: fetch_one(i, fetch), stale)):
+            if entry is not None:
+                cache[i] = entry
+    if cache_path and stale:
+        write_cache(cache, cache_path)
+    
+    rows = [[cache.get(i, {}).get(column) for column in FUNDAMENTALS] for i in s]
+    return pd.DataFrame(rows, index=list(s), columns=list(FUNDAMENTALS), dtype=float)
+
+
 def get_betas(s):
     """
     Using yfinance, getting stock betas from Yahoo finance database.
@@ -33,17 +220,7 @@ def get_betas(s):
 
     """
     
-    # Use yahoo finance database to get betas
-    betas = []
-    for i in s:
-        try:
-            ticker = yf.Ticker(i)
-            betas.append(ticker.info['beta'])
-        except:
-            print("Beta not found for " + i)
-            betas.append(None)
-    
-    return betas
+    return fetch_fundamentals(s)['Beta'].tolist()
         
 
 def get_average_dividend_yields(s):
@@ -57,21 +234,11 @@ def get_average_dividend_yields(s):
 
     Returns
     -------
-    None.
+    list of yields.
 
     """
     
-    # Use yahoo finance database to get yields
-    yields = []
-    for i in s:
-        ticker = yf.Ticker(i)
-        try:
-            yields.append(ticker.info['fiveYearAvgDividendYield'])
-        except:
-            print("Yield not found for " + i)
-            yields.append(None)
-    
-    return yields
+    return fetch_fundamentals(s)['Dividend yield'].tolist()
 
 
 def get_pe(s):
@@ -90,70 +257,147 @@ def get_pe(s):
 
     """
     
-    # Use yahoo finance database to get p/e's
-    pe = []
-    for i in s:
-        ticker = yf.Ticker(i)
-        try:
-            pe.append(ticker.info['trailingPE'])
-        except:
-            print("P/E not found for " + i)
-            pe.append(None)
+    return fetch_fundamentals(s)['P/E'].tolist()
     
-    return pe
+
+def periods_per_year(dates):
+    """
+    Sampling frequency of a price history, e.g. about 12 for monthly, 52 for 
+    weekly and 252 for daily prices.
+
+    Parameters
+    ----------
+    dates : Series
+        dates of prices, in ascending order.
+
+    Returns
+    -------
+    int
+        number of prices per year.
+
+    """
     
+    dates = pd.to_datetime(dates)
+    years = (dates.iloc[-1]-dates.iloc[0]).days/365.25
+    return max(int(round((len(dates)-1)/years)), 1)
+
+
+def return_statistics(m, periods=None, rf=None):
+    """
+    Return statistics of a market index, for prices of any sampling frequency.
+    
+    Annual returns are calculated from open of a period to adjusted close a year 
+    later, over consecutive non-overlapping years. Volatility is the annualized 
+    standard deviation of returns of each period, from open to adjusted close.
+
+    Parameters
+    ----------
+    m : DataFrame
+        price history of index, with columns Date, Open and Adj Close.
+    periods : int, optional
+        number of periods per year, by default inferred from dates.
+    rf : float, optional
+        risk-free rate, for market risk premium.
+
+    Returns
+    -------
+    dict
+        average annual return, volatility, risk free rate and market risk 
+        premium, and number of periods per year and of periods.
 
-def market_returns(markets, names):
+    """
+    
+    if periods is None:
+        periods = periods_per_year(m['Date'])
+    opens = m['Open'].to_numpy(dtype=float)
+    closes = m['Adj Close'].to_numpy(dtype=float)
+    
+    # changes in each period
+    changes = (closes-opens)/opens
+    
+    # annual changes, starting from the second period
+    starts = np.arange(1, len(m)-periods, periods)
+    annuals = (closes[starts+periods]-opens[starts])/opens[starts]
+    
+    stats = {'Average Return': np.mean(annuals) if len(annuals) else np.nan,
+             'Volatility': np.std(changes, ddof=1)*np.sqrt(periods),
+             'Periods per year': periods,
+             'Periods': len(changes)}
+    if rf is not None:
+        stats['Risk free rate'] = rf
+        # market premium = average market return - risk free rate
+        stats['Market risk premium'] = stats['Average Return']-rf
+    return stats
+
+
+def market_returns(markets, names, rf=None, periods=None):
     """
     Calculating average market returns.
 
     Parameters
     ----------
-    markets : Dataframe
-        dataframes with market index information.
+    markets : list
+        dataframes with market index information, of any sampling frequency.
     names : list
         names of corresponding stock markets.
+    rf : list, optional
+        risk-free rates of markets, for market risk premiums.
+    periods : int, optional
+        number of periods per year, by default inferred from dates of each market.
 
     Returns
     -------
     annual_returns : Dataframe
-        annual average returns of each market in dataframe.
-
-    """
-    
-    # calculate monthly changes
-    for m in markets:
-        m["Change"] = [(m_close-m_open)/m_open for m_open, m_close in zip (m['Open'],m['Adj Close'])]
-    
-    print("\nAverage change in monthly returns, number of examinations")
-    i = 0
-    for m in markets:
-        print(names[i], np.mean(m['Change']), len(m['Change']))
-        i+=1
-    
-    # calculating annual change of return
-    annuals_markets = []
-    annuals = []
-    j = 0
-    for m in markets:  
-        i = 1
-        while i < (len(m)-12): # iterate until end of file
-            open_jan = m['Open'][i] # january 1st open value
-            close_jan = m['Adj Close'].values[i+12] # next year's january 1st close value
-            
-             # annual change in value
-            annuals.append((close_jan - open_jan)/open_jan)
-            i += 12 # next year
-        annuals_markets.append([names[j],np.mean(annuals)])
-        j+=1
+        average annual return and volatility of each market in dataframe, and risk
+        free rate and market risk premium if rf is given.
+
+    """
+    
+    rf = [None]*len(markets) if rf is None else rf
+    stats = [return_statistics(m, periods, r) for m, r in zip(markets, rf)]
+    annual_returns = pd.DataFrame(stats)
+    annual_returns.insert(0, 'Market', list(names))
     
     print("\nAverage annual returns") 
-    for a in annuals_markets:
-        print(a)
+    print(annual_returns.to_string(index=False))
     
-    return pd.DataFrame(annuals_markets,columns=['Market','Average Return'])
+    return annual_returns
     
 
+def company_markets(companies):
+    """
+    Market of each company, as index to markets in order of INDICES.
+    
+    Companies listed in Nasdaq Nordic are in the market of their country, 
+    determined by the suffix of their symbol (.HE, .ST, by default .CO). 
+    Otherwise NYSE listing takes precedence over Nasdaq.
+
+    Parameters
+    ----------
+    companies : DataFrame or dataset.Dataset
+        company data, with columns Symbol NQ, Symbol NYSE and Symbol NQ North.
+
+    Returns
+    -------
+    np.array
+        market indeces, -1 for companies without any listing.
+
+    """
+    
+    markets = np.full(len(companies), -1)
+    markets[np.asarray(companies['Symbol NQ']) != 'na'] = 0
+    markets[np.asarray(companies['Symbol NYSE']) != 'na'] = 1
+    
+    # for nasdaq north, company's origin country has to be determined since rf-rate 
+    # and mr-premiums are country specific for this market
+    north = pd.Series(np.asarray(companies['Symbol NQ North'])).astype(str)
+    suffix = north.str.rsplit('.', n=1).str[-1]
+    nordic = (2 + (suffix == 'HE') + 2*(suffix == 'ST')).to_numpy()
+    listed = (north != 'na').to_numpy()
+    markets[listed] = nordic[listed]
+    return markets
+
+
 def er(companies, rf, mrp):
     """
     Calculate expected returns.
@@ -161,41 +405,27 @@ def er(companies, rf, mrp):
     Parameters
     ----------
     companies : dataframe
-        data on companies stocks
+        data on companies stocks, with symbol columns and column Beta.
     rf : list
-        risk-free rates for different markets.
+        risk-free rates for different markets, in order of INDICES.
     mr : list
-        market risk premiums for different markets.
+        market risk premiums for different markets, in order of INDICES.
 
     Returns
     -------
-    None.
+    ers : np.array
+        expected returns, 0 for companies without any listing.
 
     """
     
-    ers = np.zeros([len(companies)])
-    # indeces
-    columns_indeces = [5,6,7]
-    beta_index = 8
-    
-    # nasdaq and nyse
-    for c in range(2):
-        for i in range(len(companies)):
-            if (companies.values[i][columns_indeces[c]] != 'na'):
-                ers[i] = capm(companies.values[i][beta_index],rf[c],mrp[c])
-    
-    # for nasdaq north, company's origin country has to be determined since rf-rate and mr-premiums
-    # are country specific for this market
-    for i in range(len(companies)):
-        # split to seperate country suffix
-        splitted = str.split(companies.values[i][7],'.')
-        market_index = 2 # default, CO
-        if splitted[-1] == 'HE':
-            market_index+=1
-        elif splitted[-1] == 'ST':
-            market_index+=2
-        ers[i] = capm(companies.values[i][beta_index],rf[market_index],mrp[market_index])
+    markets = company_markets(companies)
+    listed = markets >= 0
+    rf = np.asarray(rf, dtype=float)
+    mrp = np.asarray(mrp, dtype=float)
     
+    ers = np.zeros(len(companies))
+    betas = np.asarray(companies['Beta'], dtype=float)
+    ers[listed] = capm(betas[listed], rf[markets[listed]], mrp[markets[listed]])
     return ers
     
     
@@ -205,110 +435,258 @@ def capm(beta, rf, mrp):
 
     Parameters
     ----------
-    beta : float
+    beta : float or np.array
         stock beta.
-    rf : float
+    rf : float or np.array
         risk-free rate.
-    mrp : float
+    mrp : float or np.array
         market risk premium.
 
     Returns
     -------
-    er : float
+    er : float or np.array
         expected return.
 
     """
     
     return rf + beta*mrp
-        
-   
-# read the data
-df_nasdaq = pd.read_csv('data/^IXIC.csv')
-df_nyse = pd.read_csv('data/^NYA.csv')
-df_co = pd.read_csv('data/^OMXC20.csv').dropna(axis=0,how='any') # drop rows with null-values
-df_he = pd.read_csv('data/^OMXH25.csv').dropna(axis=0,how='any')
-df_st = pd.read_csv('data/^OMX.csv').dropna(axis=0,how='any')
-markets = [df_nasdaq,df_nyse,df_co,df_he,df_st]
-names = ['Nasdaq','NYSE','CO','HE','ST']
-
-# average returns
-annual_returns = market_returns(markets,names)
 
+
+# columns of company data, in order of final_data.csv
+COLUMNS = ['Company', 'ESG score', 'Clean200', 'ScienceBasedTargets', 'Country',
+           'Symbol NQ', 'Symbol NYSE', 'Symbol NQ North',
+           'Beta', 'Dividend yield', 'P/E']
+
+
+# index of each market, in order used by er
+INDICES = {'Nasdaq': 'data/^IXIC.csv',
+           'NYSE': 'data/^NYA.csv',
+           'CO': 'data/^OMXC20.csv',
+           'HE': 'data/^OMXH25.csv',
+           'ST': 'data/^OMX.csv'}
 # 10 y government bond yields used as risk free rates for each market
-rf_rates = [0.006,0.006,-0.0019,-0.0004,-0.0007]
-annual_returns['Risk free rate'] = rf_rates
-# market premium = average market return - risk free rate
-annual_returns['Market risk premium'] = annual_returns['Average Return']-annual_returns['Risk free rate']
+RF_RATES = {'Nasdaq': 0.006,
+            'NYSE': 0.006,
+            'CO': -0.0019,
+            'HE': -0.0004,
+            'ST': -0.0007}
 
-annual_returns.to_csv('data/market_data.csv')
 
+def calculate_market_data(path='data/market_data.csv'):
+    """
+    Calculate average returns and risk premiums of markets, and save them.
 
-# ==== 2. getting stock betas =====
+    Parameters
+    ----------
+    path : str
+        path to output file.
 
-#  get data
-df_companies = pd.read_csv('data/combined_data.csv',index_col=0)
+    Returns
+    -------
+    annual_returns : DataFrame
+        average return, volatility, risk free rate and market risk premium of 
+        each market, see market_returns.
 
-# for using yahoo finance database , nordic companies need a stock market suffix to the end
-# of the stock symbols: e.g. "FORTUM.HE" = "Stock market of Helsinki"
-df_symbols_nq_north = df_companies.loc[:,['Country','Symbol NQ_North']]
-countries = ['Finland','Sweden','Denmark']
-suffixes = ['.HE','.ST','.CO']
-for c in range(len(countries)):
-   df_symbols_nq_north.loc[df_symbols_nq_north['Country'] == countries[c], 'Symbol NQ_North'] +=suffixes[c] 
+    """
+    
+    markets = [pd.read_csv(INDICES[name]).dropna(axis=0,how='any').reset_index(drop=True)
+               for name in INDICES]
+    annual_returns = market_returns(markets,list(INDICES),[RF_RATES[name] for name in INDICES])
+    
+    # written only when changed, so that incremental refreshes see whether 
+    # market data has changed since them
+    text = annual_returns.to_csv()
+    if not os.path.exists(path) or open(path).read() != text:
+        with open(path,'w') as file:
+            file.write(text)
+    return annual_returns
 
-# in nordic markets, some stocks are "A, B or C"- types. 
-# in these casesm the spelling in yahoo requires a dash instead of a space.
-# E.g. "TEL2 B.ST" has to be TEL2-B.ST"
-list_symbols = df_symbols_nq_north['Symbol NQ_North'].values
-letters = ['A','B','C']
-for s in range(len(list_symbols)):
-    try:
-        splitted = str.replace(list_symbols[s],'.',' ').split()   
-        if splitted[1] in letters:
-            list_symbols[s] = str.replace(list_symbols[s], ' ', '-')
-    except:
-        pass
-
-# replace with edited stock symbols
-df_companies['Symbol NQ North'] = list_symbols
-#df_companies = df_companies.drop(axis=0,columns=['Unnamed: 0','Unnamed: 0.1','Unnamed: 0.1.1'])
-print(df_companies.head())
-"""
-# drop companies for which stock symbols aren't available
-df_companies = df_companies.loc[(df_companies['Symbol NQ'] != 'na')\
-                                | (df_companies['Symbol NYSE'] != 'na')\
-                                | (df_companies['Symbol NQ_North'] != 'na')]
-"""
-# extract stock symbols and save into a list. 
-# in the data, there is three columns for different markets, but only most companies
-# are only listed on one market.
-df_symbols = df_companies.loc[:,'Symbol NQ':'Symbol NQ_North']
-
-list_symbols = []
-for i in range(len(df_symbols)):
-    row = df_symbols.iloc[i,:].values
-    for j in row: 
-        if j != 'na': 
-            list_symbols.append(j)
-            break
-
-
-# get ratios
-betas = get_betas(list_symbols)
-yields = get_average_dividend_yields(list_symbols)
-pe = get_pe(list_symbols)
-df_companies['Beta'] = betas
-df_companies['Dividend yield'] = yields
-df_companies['P/E'] = pe
-
-# drop rows with missing data
-df_companies = df_companies.dropna(axis=0,how='any',subset=['Beta','Dividend yield','P/E'])
-df_companies.to_csv('data/data_combined.csv')
-
-data = pd.read_csv('data/data_combined.csv')
-md = pd.read_csv('data/market_data.csv')
-rf = md['Risk free rate']
-mrp = md['Market risk premium']
-ers = er(data, rf, mrp)
-data['Expected return'] = ers
-data.to_csv('data/data_combined.csv')
\ No newline at end of file
+
+def nordic_symbols(companies):
+    """
+    Stock symbols of Nasdaq Nordic companies in the form used by Yahoo Finance.
+    
+    For using yahoo finance database, nordic companies need a stock market suffix 
+    to the end of the stock symbols: e.g. "FORTUM.HE" = "Stock market of Helsinki".
+    In nordic markets, some stocks are "A, B or C"- types. In these cases the 
+    spelling in yahoo requires a dash instead of a space, e.g. "TEL2 B.ST" has to 
+    be "TEL2-B.ST".
+
+    Parameters
+    ----------
+    companies : DataFrame
+        company data, in the format of combined_data.csv.
+
+    Returns
+    -------
+    Series
+        symbols, 'na' for companies not listed in Nasdaq Nordic.
+
+    """
+    
+    symbols = companies['Symbol NQ_North'].astype(str).copy()
+    listed = symbols != 'na'
+    countries = ['Finland','Sweden','Denmark']
+    suffixes = ['.HE','.ST','.CO']
+    for country, suffix in zip(countries, suffixes):
+        symbols[listed & (companies['Country'] == country)] += suffix
+    
+    # share classes
+    share_class = symbols.str.match(r'^\S+ [ABC](\.|$)')
+    symbols[share_class] = symbols[share_class].str.replace(' ', '-', n=1)
+    return symbols
+
+
+def company_table(companies):
+    """
+    Company data in the format of final_data.csv, without fundamentals.
+
+    Parameters
+    ----------
+    companies : DataFrame
+        company data, in the format of combined_data.csv.
+
+    Returns
+    -------
+    DataFrame
+        company data with symbols of Nasdaq Nordic in the form used by Yahoo Finance.
+
+    """
+    
+    table = companies.copy()
+    table['Symbol NQ North'] = nordic_symbols(companies)
+    for column in FUNDAMENTALS:
+        table[column] = np.nan
+    return table[COLUMNS]
+
+
+def stock_symbols(companies):
+    """
+    Symbol of each company in Yahoo Finance.
+    
+    In the data, there is three columns for different markets, but most companies
+    are only listed on one market. The first available symbol is used.
+
+    Parameters
+    ----------
+    companies : DataFrame
+        company data, see company_table.
+
+    Returns
+    -------
+    Series
+        symbols, None for companies without any symbol.
+
+    """
+    
+    symbols = companies[['Symbol NQ','Symbol NYSE','Symbol NQ North']]
+    symbols = symbols.where(symbols != 'na')
+    return symbols.bfill(axis=1).iloc[:,0].where(lambda x: x.notna(), None)
+
+
+def refresh_company_data(companies_path='data/combined_data.csv',
+                         output='data/data_combined.csv',
+                         market_path='data/market_data.csv',
+                         incremental=False,
+                         fetch=yahoo_info,
+                         workers=8,
+                         cache_path=FUNDAMENTALS_CACHE,
+                         ttl=FUNDAMENTALS_TTL):
+    """
+    Get fundamentals of companies and calculate their expected returns.
+    
+    In incremental mode, only stale, new and previously missing tickers are fetched 
+    (see stale_symbols), results are merged into the existing output, and expected 
+    returns are recalculated only for companies that are new or whose symbol or beta 
+    changed, or for all companies if market data has changed since the last refresh. 
+    Otherwise, all tickers are fetched and all expected returns calculated.
+    Companies with missing fundamentals are left out of the output.
+
+    Parameters
+    ----------
+    companies_path : str
+        path to company data, in the format of combined_data.csv.
+    output : str
+        path to output file.
+    market_path : str
+        path to market data, see calculate_market_data.
+    incremental : bool
+        refresh incrementally.
+    fetch : function
+        returns metadata of a stock, see fetch_fundamentals.
+    workers : int
+        maximum number of concurrent requests.
+    cache_path : str
+        path to cache file of fundamentals.
+    ttl : float
+        time to live of cached fundamentals, in seconds, in incremental mode.
+
+    Returns
+    -------
+    data : DataFrame
+        company data with fundamentals and expected returns.
+    updated : int
+        number of companies whose expected returns were calculated.
+
+    """
+    
+    companies = company_table(pd.read_csv(companies_path,index_col=0))
+    symbols = stock_symbols(companies)
+    listed = symbols.notna()
+    
+    # get ratios, all fundamentals of a stock in a single request
+    fundamentals = fetch_fundamentals(symbols[listed].tolist(), fetch, workers, 
+                                      cache_path, ttl if incremental else 0)
+    for column in FUNDAMENTALS:
+        companies.loc[listed,column] = fundamentals[column].values
+    
+    # drop rows with missing data
+    data = companies.dropna(axis=0,how='any',subset=list(FUNDAMENTALS))
+    
+    md = pd.read_csv(market_path)
+    rf = md['Risk free rate']
+    mrp = md['Market risk premium']
+    
+    affected = pd.Series(True, index=data.index)
+    if (incremental and os.path.exists(output) 
+        and os.path.getmtime(market_path) <= os.path.getmtime(output)):
+        # parsed exactly, so that unchanged betas compare equal
+        previous = pd.read_csv(output,index_col=0,float_precision='round_trip')
+        previous = previous.reindex(data.index)
+        symbol_columns = ['Symbol NQ','Symbol NYSE','Symbol NQ North']
+        affected = (previous['Expected return'].isna()
+                    | (previous['Beta'] != data['Beta'])
+                    | (previous[symbol_columns] != data[symbol_columns]).any(axis=1))
+        data = data.assign(**{'Expected return': previous['Expected return']})
+    else:
+        data = data.assign(**{'Expected return': np.nan})
+    
+    if affected.any():
+        data.loc[affected,'Expected return'] = er(data.loc[affected,COLUMNS], rf, mrp)
+    data.to_csv(output)
+    print("Expected returns calculated for " + str(int(affected.sum())) + " of " 
+          + str(len(data)) + " companies")
+    return data, int(affected.sum())
+
+
+def main():
+    """
+    Calculate market data, fundamentals of companies and their expected returns.
+    """
+    
+    parser = argparse.ArgumentParser(
+        description='Calculate market data and fundamentals of companies.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fetch only stale, new or missing tickers, and '
+                             'recalculate only affected expected returns')
+    parser.add_argument('--skip-markets', action='store_true',
+                        help='use existing market data')
+    args = parser.parse_args()
+    
+    if not args.skip_markets:
+        calculate_market_data()
+    refresh_company_data(incremental=args.incremental)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,11 @@
 # -*- coding: utf-8 -*-
 
-import ad
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import weakref
 import numpy as np
-import pandas as pd
-from pyomo.environ import *
-from pyomo.opt import SolverFactory
-from scipy.optimize import minimize
+from instrumentation import phase
+import pareto
 
 """
 Created on Thu Apr 30 16:27:05 2020
@@ -15,33 +14,48 @@ Created on Thu Apr 30 16:27:05 2020
 
 """
 
-def params(data):
+# upper bound for weight of a company
+MAX_WEIGHT = 0.05
+
+def params(data, screen=False):
     """
     Initialize optimization problem by gathering parameter data together.
 
     Parameters
     ----------
-    data : dataframe
+    data : DataFrame or dataset.Dataset
         problem data.
+    screen : bool
+        leave out companies which can not change the optimal values of 
+        objectives, see pareto.screen. Safe for the linear constraints of the 
+        problem, not for a bound for variance. The number of companies of each 
+        nondominated layer and the number left out are printed.
 
     Returns
     -------
+    names : np.array
+        company names.
     params : list
         parameter data for problem.
 
     """
     
-    names = data['Company'].values
+    names = np.asarray(data['Company'])
     
     # parameters
-    companies = data['Company'].index
-    betas = data['Beta'].values
-    returns = data['Expected return'].values
-    sustainabilities = data['ESG score'].values
-    cleans = data['Clean200']+data['ScienceBasedTargets']
-    dys = data['Dividend yield'].values
-    pes = data['P/E'].values
+    companies = range(len(names))
+    betas = np.asarray(data['Beta'])
+    returns = np.asarray(data['Expected return'])
+    sustainabilities = np.asarray(data['ESG score'])
+    cleans = np.asarray(data['Clean200'])+np.asarray(data['ScienceBasedTargets'])
+    dys = np.asarray(data['Dividend yield'])
+    pes = np.asarray(data['P/E'])
     params = [companies,betas,returns,sustainabilities,dys,cleans,pes]
+    if screen:
+        keep, layers = pareto.screen(np.column_stack(params[2:]),betas,MAX_WEIGHT)
+        pareto.print_screening(keep,layers)
+        names = names[keep]
+        params = [range(len(names))] + [np.asarray(p)[keep] for p in params[1:]]
     return names, params
 
 
@@ -63,7 +77,252 @@ def rule(model, params):
 
     """
     
-    return sum(model.x[i]*params[i] for i in range(len(data)))
+    from pyomo.core.expr.numeric_expr import LinearExpression
+    
+    # linear expression built directly from coefficients and variables, 
+    # instead of summing the terms one by one
+    return LinearExpression(constant=0, 
+                            linear_coefs=[float(p) for p in params],
+                            linear_vars=[model.x[i] for i in range(len(params))])
+
+
+def build_model(params, b_tol=0.1, risk=None):
+    """
+    Build Pyomo model of the problem, according to epsilon constraint method.
+    
+    The model is built once per dataset. Objective to be optimized, bounds 
+    for the other objectives and tolerance for beta are set with set_problem,
+    without rebuilding the model.
+    
+    With a risk model, the model includes a constraint bounding variance of 
+    the portfolio, inactive until a bound is set with set_problem. Variance is
+    expressed through the exposures of the portfolio to the k factors of the 
+    risk model, with n*k linear and k*k+n quadratic terms, instead of the n*n 
+    terms of a covariance matrix. The constraint is quadratic, and requires a 
+    solver supporting quadratic constraints, see QUADRATIC_SOLVERS.
+
+    Parameters
+    ----------
+    params : list
+        parameter data for problem.
+    b_tol : float
+        tolerance for beta constraint.
+    risk : risk.RiskModel, optional
+        factor model of risk of the companies, see risk.risk_model.
+
+    Returns
+    -------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        pyomo optimization model.
+
+    """
+    
+    from pyomo.environ import (ConcreteModel, Constraint, Expression, NonNegativeReals,
+                               Objective, Param, Reals, Set, Var, maximize, quicksum)
+    
+    model = ConcreteModel()
+    # decision variables
+    default = 1/len(params[0]) # initialize with equal weights
+    model.x = Var(params[0], initialize=default, bounds=(0,MAX_WEIGHT), within=NonNegativeReals)
+    
+    # objectives, in order of objectives
+    model.K = Set(initialize=range(len(params)-2))
+    obj_params = params[2:]
+    model.f = Expression(model.K, rule=lambda model,k: rule(model,obj_params[k]))
+    
+    # mutable parameters, changed between solves
+    model.b_tol = Param(initialize=b_tol, mutable=True)
+    model.bound = Param(model.K, initialize=0, mutable=True)
+       
+    # objective functions, only one of them active at a time
+    model.obj_max = Objective(range(4), rule=lambda model,k: model.f[k], sense=maximize)
+    # p/e ratio minimized
+    model.obj_min = Objective(expr=model.f[4])
+    
+    # beta constraint
+    model.beta = Expression(expr=rule(model,params[1]))
+    model.beta_geq = Constraint(expr = model.beta <= 1+model.b_tol)
+    model.beta_leq = Constraint(expr = model.beta >= 1-model.b_tol)
+    
+    # constraints for objectives, the one of optimized objective is deactivated
+    def bound_rule(model, k):
+        if k < 4:
+            return model.f[k] >= model.bound[k]
+        # p/e ratio bounded from above
+        return model.f[k] <= model.bound[k]
+    model.c = Constraint(model.K, rule=bound_rule)
+    
+    # sum of weights
+    model.sum_weights = Constraint(expr = rule(model,np.ones(len(params[0]))) == 1)
+    
+    if risk is not None:
+        # exposures of the portfolio to factors, B^T x
+        model.F = Set(initialize=range(len(risk.factor_cov)))
+        model.exposure = Var(model.F, within=Reals)
+        model.exposure_def = Constraint(
+            model.F, rule=lambda model,j: model.exposure[j] == rule(model,risk.loadings[:,j]))
+        
+        # variance of portfolio, e^T F e + sum of D_i x_i^2
+        cov, idio = risk.factor_cov, risk.idiosyncratic
+        model.max_variance = Param(initialize=0, mutable=True)
+        model.variance = Expression(expr = 
+            quicksum(float(cov[a,b])*model.exposure[a]*model.exposure[b] 
+                     for a in model.F for b in model.F)
+            + quicksum(float(idio[i])*model.x[i]**2 for i in model.x if idio[i] != 0))
+        model.risk = Constraint(expr = model.variance <= model.max_variance)
+        model.risk.deactivate()
+    
+    set_problem(model,4,[0]*4,b_tol)
+    return model
+
+
+def objective(model, obj_i):
+    """
+    Objective component of the model for given objective.
+
+    Parameters
+    ----------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        model from build_model.
+    obj_i : int
+        index of objective.
+
+    Returns
+    -------
+    pyomo objective.
+
+    """
+    
+    return model.obj_max[obj_i] if obj_i < 4 else model.obj_min
+
+
+def set_problem(model, obj_i, constraints, b_tol=None, max_variance=None):
+    """
+    Select objective to be optimized and set bounds for the other objectives.
+
+    Parameters
+    ----------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        model from build_model.
+    obj_i : int
+        index of objective to be optimized.
+    constraints : list
+        lower/upper bounds for the other four objectives, in order of objectives.
+    b_tol : float, optional
+        tolerance for beta constraint, unchanged if not given.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, unchanged if not given. 
+        np.inf removes the bound. The model must be built with a risk model.
+
+    """
+    
+    for k in model.K:
+        objective(model,k).deactivate()
+        model.c[k].activate()
+    objective(model,obj_i).activate()
+    model.c[obj_i].deactivate()
+    
+    others = [k for k in model.K if k != obj_i]
+    for k, bound in zip(others, constraints):
+        model.bound[k] = bound
+    if b_tol is not None:
+        model.b_tol = b_tol
+    if max_variance is not None:
+        if not hasattr(model,'risk'):
+            raise ValueError("Model is built without a risk model, variance can not be bounded")
+        if np.isinf(max_variance):
+            model.risk.deactivate()
+        else:
+            model.max_variance = max_variance
+            model.risk.activate()
+
+
+# solver instances kept for each model, so that persistent solvers are reused
+_solvers = weakref.WeakKeyDictionary()
+
+
+def solve_model(model, solver='glpk', tee=False):
+    """
+    Solve the model with its current objective and bounds.
+    
+    The solver instance is kept with the model. Persistent solvers 
+    (e.g. gurobi_persistent, cplex_persistent) get the model once, and on 
+    re-solves only the objective and the constraints with changing bounds are sent.
+
+    Parameters
+    ----------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        model from build_model.
+    solver : str
+        name of solver.
+    tee : bool
+        print solver output.
+
+    Returns
+    -------
+    res : pyomo.opt.results.results_.SolverResults
+        optimization result, solution not loaded into model.
+
+    """
+    
+    from pyomo.environ import Objective, SolverFactory
+    from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+    
+    # constraints depending on mutable parameters or switched on and off
+    changing = [model.beta_geq, model.beta_leq] + [model.c[k] for k in model.K]
+    if hasattr(model,'risk'):
+        changing.append(model.risk)
+    
+    solvers = _solvers.setdefault(model, {})
+    if solver not in solvers:
+        opt = SolverFactory(solver)
+        # names of changing constraints currently in a persistent solver
+        added = set()
+        if isinstance(opt, PersistentSolver):
+            opt.set_instance(model)
+            added = set(c.name for c in changing if c.active)
+        solvers[solver] = (opt, added)
+    opt, added = solvers[solver]
+    
+    if not isinstance(opt, PersistentSolver):
+        return opt.solve(model, tee=tee, load_solutions=False)
+    
+    # replace changing constraints in the solver, objective may have been switched
+    for c in changing:
+        if c.name in added:
+            opt.remove_constraint(c)
+            added.remove(c.name)
+        if c.active:
+            opt.add_constraint(c)
+            added.add(c.name)
+    opt.set_objective(next(model.component_data_objects(Objective, active=True)))
+    return opt.solve(tee=tee, load_solutions=False)
+
+
+def load_solution(model, res):
+    """
+    Load solution from result into the model.
+
+    Parameters
+    ----------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        model from build_model.
+    res : pyomo.opt.results.results_.SolverResults
+        optimization result from solve_model.
+
+    Returns
+    -------
+    bool
+        True if an optimal solution was found and loaded, otherwise False.
+
+    """
+    
+    from pyomo.opt import TerminationCondition
+    
+    if res.solver.termination_condition != TerminationCondition.optimal:
+        return False
+    model.solutions.load_from(res)
+    return True
 
 
 def solve_problem(params,
@@ -71,9 +330,14 @@ def solve_problem(params,
                   #objectives,
                   obj_i,
                   constraints,
-                  b_tol):
+                  b_tol,
+                  model=None,
+                  backend='auto',
+                  stats=None,
+                  risk=None,
+                  max_variance=None):
     """
-    Solve the problem using epsilon constraint method with Pyomo.
+    Solve the problem using epsilon constraint method.
 
     Parameters
     ----------
@@ -96,77 +360,466 @@ def solve_problem(params,
         lower/upper bounds for constraint functions.
     b_tol : float
         tolerance for beta constraint.
+    model : optional
+        problem from build_problem for the same backend, reused instead of building a new one.
+    backend : str
+        LP solver backend, see solve_backend. By default selected by select_backend.
+    stats : instrumentation.Stats, optional
+        collects timers of phases 'build' and 'solve', and solver iteration counts.
+    risk : risk.RiskModel, optional
+        factor model of risk of the companies, needed for max_variance when 
+        the model is built here.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, see build_model. By default, 
+        variance is not constrained.
 
     Returns
     -------
-    res : pyomo.opt.results.results_.SolverResults
-        optimization result.
+    x : np.array or None
+        weights of companies, None if the problem is infeasible.
+    backend : str
+        backend used.
 
     """
     
-    model = ConcreteModel()
-    # decision variables
-    default = 1/len(params[0]) # initialize with equal weights
-    model.x = Var(params[0], initialize=default, bounds=(0,0.05), within=NonNegativeReals)
-       
-    # objective function
-    if obj_i < 4:
-        model.obj =  Objective(expr=rule(model,params[obj_i+2]),sense=maximize)
-    else:
-        # p/e ratio minimized
-        model.obj =  Objective(expr=rule(model,params[obj_i+2]))
-    
-    # delete objective function from params
-    del params[obj_i+2]
-    
-    # beta constraint
-    model.beta_geq = Constraint(expr = rule(model,params[1]) <=1+b_tol)
-    model.beta_leq = Constraint(expr = rule(model,params[1]) >=1-b_tol)
-    
-    # constraints
-    model.c1 = Constraint(expr = rule(model,params[0]+2) >= constraints[0])
-    model.c2 = Constraint(expr = rule(model,params[1]+2) >= constraints[1])
-    model.c3 = Constraint(expr = rule(model,params[2]+2) >= constraints[2])
-    if obj_i < 4:
-        model.c4 = Constraint(expr = rule(model,params[3]+2) <= constraints[3])
-    else:
-        # p/e ratio is as objective function
-        model.c4 = Constraint(expr = rule(model,params[3]+2) >= constraints[3])
-    
-    # sum of weights
-    model.sum_weights = Constraint(expr = rule(model,np.ones(len(data))) == 1)
+    if backend == 'auto':
+        backend = select_backend(len(params[0]),quadratic=max_variance is not None)
+    if model is None:
+        if max_variance is not None and risk is None:
+            raise ValueError("Risk model is needed for bounding variance")
+        with phase(stats,'build'):
+            model = build_problem(params,b_tol,backend,risk)
     
     # solve
-    opt = SolverFactory("glpk")
-    res = opt.solve(model, tee=True)
-    print(type(res))
+    with phase(stats,'solve'):
+        x = solve_backend(model,obj_i,constraints,backend,b_tol,stats,max_variance)
+    print("\nSolved with " + backend)
+    if x is None:
+        print("No feasible solution found")
+        return x, backend
     
     print("\nObjective function value")
+    print(x @ np.asarray(params[obj_i+2],dtype=float))
     
     print("\nBeta")
-    print(sum(model.x[i].value*params[1][i] for i in range(len(params[0]))))
+    print(x @ np.asarray(params[1],dtype=float))
+    if max_variance is not None:
+        print("\nVariance")
+        print(model.variance())
     
     print("\nCompanies to invest in:")
-    c = []
-    w = []
-    for j in range(len(model.x)):
-        if model.x[j].value != 0:
-            c.append(names[j])
-            w.append(model.x[j].value)
-            print(names[j] + str(model.x[j].value))
-    
-    return res
-    
-
-data = pd.read_csv('data/final_data.csv')
-n,p = params(data)
-obj_i = 4
-constraints = [
-                0.09 # return
-               ,0.6 # sustainability
-               ,2   # dividend yield
-               ,1   # clean energy use
-               #,15 # p/e ratio
-               ]
-b_tol = 0.1
-solve_problem(p,n,obj_i,constraints,b_tol)
\ No newline at end of file
+    for j in range(len(x)):
+        if x[j] != 0:
+            print(names[j] + str(x[j]))
+    
+    return x, backend
+
+
+def _iterations(res):
+    """
+    Number of solver iterations from pyomo results, None if not reported.
+    """
+    
+    try:
+        return int(res.solver.statistics.number_of_iterations)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def solve_bounds(model, obj_i, constraints, b_tol=None, solver='glpk', stats=None,
+                 max_variance=None):
+    """
+    Solve the problem quietly for one set of bounds.
+
+    Parameters
+    ----------
+    model : pyomo.core.base.PyomoModel.ConcreteModel
+        model from build_model.
+    obj_i : int
+        index of objective to be optimized.
+    constraints : list
+        lower/upper bounds for the other four objectives.
+    b_tol : float, optional
+        tolerance for beta constraint, unchanged if not given.
+    solver : str
+        name of solver.
+    stats : instrumentation.Stats, optional
+        collects solver iteration counts, when reported by the solver.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, unchanged if not given, 
+        see set_problem.
+
+    Returns
+    -------
+    np.array or None
+        weights of companies, None if the problem is infeasible.
+
+    """
+    
+    set_problem(model,obj_i,constraints,b_tol,max_variance)
+    res = solve_model(model,solver)
+    if stats is not None:
+        stats.count('lp')
+        stats.add_iterations('solve',_iterations(res))
+    if not load_solution(model,res):
+        return None
+    return np.array([model.x[i].value for i in model.x])
+
+
+def lp_form(params, b_tol=0.1):
+    """
+    Problem data in matrix form, for solving the problem with scipy.optimize.linprog.
+
+    Parameters
+    ----------
+    params : list
+        parameter data for problem.
+    b_tol : float
+        default tolerance for beta constraint.
+
+    Returns
+    -------
+    dict
+        n x 5 objective matrix, betas, default tolerance for beta and 
+        upper bound for weights.
+
+    """
+    
+    return {'values': np.column_stack([np.asarray(p,dtype=float) for p in params[2:]]),
+            'betas': np.asarray(params[1],dtype=float),
+            'b_tol': b_tol,
+            'upper': MAX_WEIGHT}
+
+
+def solve_matrix(lp, obj_i, constraints, b_tol=None, stats=None):
+    """
+    Solve the problem for one set of bounds with HiGHS, through scipy.optimize.linprog.
+
+    Parameters
+    ----------
+    lp : dict
+        problem from lp_form.
+    obj_i : int
+        index of objective to be optimized.
+    constraints : list
+        lower/upper bounds for the other four objectives.
+    b_tol : float, optional
+        tolerance for beta constraint, by default the one in lp.
+    stats : instrumentation.Stats, optional
+        collects solver iteration counts.
+
+    Returns
+    -------
+    np.array or None
+        weights of companies, None if the problem is infeasible.
+
+    """
+    
+    values, betas = lp['values'], lp['betas']
+    if b_tol is None:
+        b_tol = lp['b_tol']
+    
+    # maximized objectives and lower bounds negated, linprog minimizes 
+    # subject to upper bounds
+    sign = np.where(np.arange(values.shape[1]) < 4, -1.0, 1.0)
+    others = [k for k in range(values.shape[1]) if k != obj_i]
+    
+    A_ub = np.vstack([betas, -betas, (values[:,others]*sign[others]).T])
+    b_ub = np.concatenate([[1+b_tol, -(1-b_tol)], sign[others]*np.asarray(constraints,dtype=float)])
+    from scipy.optimize import linprog
+    res = linprog(sign[obj_i]*values[:,obj_i], A_ub=A_ub, b_ub=b_ub,
+                  A_eq=np.ones((1,len(betas))), b_eq=[1.0], 
+                  bounds=(0,lp['upper']), method='highs')
+    if stats is not None:
+        stats.count('lp')
+        stats.add_iterations('solve',res.nit)
+    if res.status != 0:
+        return None
+    return res.x
+
+
+# pyomo solvers selected automatically when installed, in order of preference
+PERSISTENT_SOLVERS = ['gurobi_persistent', 'cplex_persistent', 'xpress_persistent']
+# pyomo solvers keeping the model and basis between solves, preferred for 
+# repeated solves of the same model, see select_backend. appsi_highs needs 
+# Pyomo >= 6 and highspy, not in requirements.txt
+WARM_START_SOLVERS = PERSISTENT_SOLVERS + ['appsi_highs']
+# pyomo solvers supporting the quadratic variance constraint, in order of preference
+QUADRATIC_SOLVERS = ['gurobi_persistent', 'cplex_persistent', 'gurobi', 'cplex', 'ipopt']
+# number of companies above which glpk is considered too slow
+LARGE_PROBLEM = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def solver_available(solver):
+    """
+    Check whether a solver is installed.
+
+    Parameters
+    ----------
+    solver : str
+        name of pyomo solver, or 'highs' for scipy's HiGHS.
+
+    Returns
+    -------
+    bool
+        True if the solver can be used.
+
+    """
+    
+    if solver == 'highs':
+        return True
+    try:
+        from pyomo.environ import SolverFactory
+        return bool(SolverFactory(solver).available(exception_flag=False))
+    except Exception:
+        return False
+
+
+def select_backend(n, quadratic=False, warm_start=False):
+    """
+    Select LP solver backend for problem size.
+    
+    Persistent solvers are preferred when installed. Otherwise glpk is used for 
+    small problems, and scipy's HiGHS for large problems or if glpk is not installed.
+    
+    For a model solved repeatedly with changing bounds (e.g. interactively), 
+    warm_start prefers solvers in WARM_START_SOLVERS. They get the model once, 
+    and re-solves start from the previous basis, while glpk and scipy's HiGHS 
+    solve each problem from scratch.
+
+    Parameters
+    ----------
+    n : int
+        number of companies.
+    quadratic : bool
+        select a solver supporting the quadratic variance constraint, 
+        from QUADRATIC_SOLVERS.
+    warm_start : bool
+        prefer solvers re-solving from the previous basis, from WARM_START_SOLVERS.
+
+    Returns
+    -------
+    str
+        name of backend.
+
+    """
+    
+    if quadratic:
+        for solver in QUADRATIC_SOLVERS:
+            if solver_available(solver):
+                return solver
+        raise ValueError("No solver supporting quadratic constraints installed, "
+                         "tried " + ', '.join(QUADRATIC_SOLVERS))
+    for solver in (WARM_START_SOLVERS if warm_start else PERSISTENT_SOLVERS):
+        if solver_available(solver):
+            return solver
+    if n < LARGE_PROBLEM and solver_available('glpk'):
+        return 'glpk'
+    return 'highs'
+
+
+def build_problem(params, b_tol, backend, risk=None):
+    """
+    Build the problem for given backend.
+
+    Parameters
+    ----------
+    params : list
+        parameter data for problem.
+    b_tol : float
+        tolerance for beta constraint.
+    backend : str
+        'highs' for matrix form, otherwise name of pyomo solver.
+    risk : risk.RiskModel, optional
+        factor model of risk of the companies, see build_model. Not supported 
+        by the matrix form.
+
+    Returns
+    -------
+    dict or pyomo.core.base.PyomoModel.ConcreteModel
+        problem from lp_form or build_model.
+
+    """
+    
+    if backend == 'highs':
+        if risk is not None:
+            raise ValueError("Variance constraint is not linear, use a pyomo solver "
+                             "supporting quadratic constraints")
+        return lp_form(params,b_tol)
+    return build_model(params,b_tol,risk)
+
+
+def solve_backend(problem, obj_i, constraints, backend, b_tol=None, stats=None,
+                  max_variance=None):
+    """
+    Solve the problem for one set of bounds with given backend.
+
+    Parameters
+    ----------
+    problem : dict or pyomo.core.base.PyomoModel.ConcreteModel
+        problem from build_problem.
+    obj_i : int
+        index of objective to be optimized.
+    constraints : list
+        lower/upper bounds for the other four objectives.
+    backend : str
+        'highs' for scipy's HiGHS, otherwise name of any installed pyomo solver, 
+        e.g. 'glpk', 'cbc' or 'gurobi_persistent'.
+    b_tol : float, optional
+        tolerance for beta constraint, unchanged if not given.
+    stats : instrumentation.Stats, optional
+        collects solver iteration counts.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, only with pyomo solvers, 
+        see set_problem.
+
+    Returns
+    -------
+    np.array or None
+        weights of companies, None if the problem is infeasible.
+
+    """
+    
+    if backend == 'highs':
+        if max_variance is not None:
+            raise ValueError("Variance constraint is not linear, use a pyomo solver "
+                             "supporting quadratic constraints")
+        return solve_matrix(problem,obj_i,constraints,b_tol,stats)
+    return solve_bounds(problem,obj_i,constraints,b_tol,backend,stats,max_variance)
+
+
+def epsilon_grid(lower, upper, steps):
+    """
+    Grid of bounds for the four objectives set to constraints.
+
+    Parameters
+    ----------
+    lower : list
+        smallest bound for each constraint.
+    upper : list
+        largest bound for each constraint.
+    steps : int or list
+        number of bounds between lower and upper, for all or each constraint.
+
+    Returns
+    -------
+    np.array
+        m x 4 matrix, each row a set of bounds.
+
+    """
+    
+    steps = np.broadcast_to(steps, len(lower))
+    axes = [np.linspace(l,u,s) for l,u,s in zip(lower,upper,steps)]
+    return np.array(np.meshgrid(*axes,indexing='ij')).reshape(len(axes),-1).T
+
+
+# problem data shared with worker processes, see pareto_front
+_shared = {}
+
+
+def _init_worker(params, b_tol, backend):
+    """
+    Build the problem in a worker process, once per process instead of once per task.
+    """
+    
+    _shared['problem'] = build_problem(params,b_tol,backend)
+
+
+def _solve_shared(obj_i, constraints, backend):
+    """
+    Solve the problem for one set of bounds in a worker process.
+    """
+    
+    return solve_backend(_shared['problem'],obj_i,constraints,backend)
+
+
+def pareto_front(params, obj_i, bounds, b_tol, workers=None, backend='auto', decimals=8):
+    """
+    Generate Pareto optimal solutions by solving the problem for multiple sets of bounds.
+    
+    Infeasible problems and duplicate solutions are dropped, and only the 
+    nondominated solutions are returned.
+
+    Parameters
+    ----------
+    params : list
+        parameter data for problem.
+    obj_i : int
+        index of objective to be optimized.
+    bounds : np.array
+        m x 4 matrix, each row bounds for the other four objectives, e.g. from epsilon_grid.
+    b_tol : float
+        tolerance for beta constraint.
+    workers : int, optional
+        number of processes solving the problems in parallel.
+    backend : str
+        LP solver backend, see solve_backend. By default selected by select_backend.
+    decimals : int
+        objective values are rounded to this many decimals when removing duplicates.
+
+    Returns
+    -------
+    F : np.array
+        objective function values of nondominated solutions.
+    X : np.array
+        weights of companies in nondominated solutions.
+    B : np.array
+        bounds, which gave the nondominated solutions.
+
+    """
+    
+    bounds = np.atleast_2d(np.asarray(bounds,dtype=float))
+    if backend == 'auto':
+        backend = select_backend(len(params[0]))
+    
+    if workers is None or workers < 2:
+        problem = build_problem(params,b_tol,backend)
+        xs = [solve_backend(problem,obj_i,c,backend) for c in bounds]
+    else:
+        # workers build the problem once, at start-up
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(params,b_tol,backend)) as pool:
+            xs = list(pool.map(_solve_shared, [obj_i]*len(bounds), bounds,
+                               [backend]*len(bounds)))
+    
+    # drop infeasible
+    feasible = [k for k in range(len(xs)) if xs[k] is not None]
+    if not feasible:
+        n = len(params[0])
+        return np.zeros((0,len(params)-2)), np.zeros((0,n)), np.zeros((0,bounds.shape[1]))
+    X = np.array([xs[k] for k in feasible])
+    B = bounds[feasible]
+    F = X @ np.column_stack([np.asarray(p,dtype=float) for p in params[2:]])
+    
+    # drop duplicates
+    _, unique = np.unique(np.round(F,decimals),axis=0,return_index=True)
+    unique = np.sort(unique)
+    F, X, B = F[unique], X[unique], B[unique]
+    
+    mask = pareto.nondominated(F)
+    return F[mask], X[mask], B[mask]
+    
+
+def main():
+    """
+    Solve the problem for final_data.csv, p/e ratio optimized.
+    """
+    
+    import dataset
+    data = dataset.load('data/final_data.csv')
+    n,p = params(data)
+    obj_i = 4
+    constraints = [
+                    0.09 # return
+                   ,0.6 # sustainability
+                   ,2   # dividend yield
+                   ,1   # clean energy use
+                   #,15 # p/e ratio
+                   ]
+    b_tol = 0.1
+    solve_problem(p,n,obj_i,constraints,b_tol)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 
-import ad
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
-from scipy.optimize import minimize
+import dataset
+from instrumentation import Stats, counted, counted_constraints, phase
+import payoff_cache
 
 """
 Created on Thu Apr 30 16:27:05 2020
@@ -13,14 +13,148 @@ Created on Thu Apr 30 16:27:05 2020
 
 """
 
-global data
-data = pd.read_csv('data/final_data.csv',index_col=0)
+DATA_PATH = 'data/final_data.csv'
+
+# company data, loaded on first use (see problem_data) or set with set_data
+data = None
+obj_matrix = None
+beta_vector = None
+# factor model of risk of the companies, built on first use, see problem_risk,
+# and fingerprint of its inputs, identifying it in the disk cache
+risk_model = None
+risk_inputs = None
 objectives = ['Expected return', 
               'Sustainability',
               'Dividend yield',
               'Clean energy use',
               'P/E ratio']
 
+
+def objective_matrix(data):
+    """
+    Build the objective matrix and beta vector of the problem from company data.
+    
+    Objective values are gathered once, so that the objective functions and
+    constraints can be evaluated as matrix-vector products.
+
+    Parameters
+    ----------
+    data : DataFrame or dataset.Dataset
+        data for companies.
+
+    Returns
+    -------
+    values : np.array
+        n x 5 matrix, row i including return, sustainability, dividend yield, 
+        clean energy use and p/e-ratio of company i.
+    betas : np.array
+        Sharpe's betas of companies.
+
+    """
+    
+    values = np.column_stack([np.asarray(data['Expected return']),
+                              np.asarray(data['ESG score']),
+                              np.asarray(data['Dividend yield']),
+                              np.asarray(data['Clean200'])+np.asarray(data['ScienceBasedTargets']),
+                              np.asarray(data['P/E'])]).astype(float)
+    betas = np.array(data['Beta'], dtype=float)
+    return values, betas
+
+
+def set_data(frame, path=None):
+    """
+    Replace the company data the problem is solved for.
+
+    Parameters
+    ----------
+    frame : DataFrame or dataset.Dataset
+        data for companies, in the format of final_data.csv.
+    path : str, optional
+        file the data was read from. Without it, ideal and nadir vectors are not cached.
+
+    """
+    
+    global data, obj_matrix, beta_vector, risk_model, risk_inputs, DATA_PATH
+    data = frame
+    obj_matrix, beta_vector = objective_matrix(data)
+    risk_model = None
+    risk_inputs = None
+    DATA_PATH = path
+
+
+def load_data(path=DATA_PATH):
+    """
+    Load company data from a csv file and solve the problem for it.
+    
+    Data is loaded through the binary format of dataset, compiled when the csv 
+    file has changed.
+
+    Parameters
+    ----------
+    path : str
+        path to data file, in the format of final_data.csv.
+
+    """
+    
+    set_data(dataset.load(path),path)
+
+
+def problem_data():
+    """
+    Objective matrix and betas of the companies the problem is solved for.
+    
+    Data is read from final_data.csv on first use, if not set before with set_data.
+
+    Returns
+    -------
+    obj_matrix : np.array
+        n x 5 objective matrix, see objective_matrix.
+    beta_vector : np.array
+        Sharpe's betas of companies.
+
+    """
+    
+    if obj_matrix is None:
+        load_data()
+    return obj_matrix, beta_vector
+
+
+def problem_risk(n=None):
+    """
+    Factor model of risk of the companies the problem is solved for.
+    
+    The model is built on first use, from the index histories in data/, see risk.
+
+    Parameters
+    ----------
+    n : int, optional
+        number of companies, by default all.
+
+    Returns
+    -------
+    risk.RiskModel
+        loadings, factor covariance and idiosyncratic variances.
+
+    """
+    
+    import risk
+    global risk_model, risk_inputs
+    problem_data()
+    if risk_model is None:
+        risk_inputs = risk.inputs_fingerprint(idiosyncratic=risk.IDIOSYNCRATIC_VARIANCE)
+        risk_model = risk.risk_model(data, risk.IDIOSYNCRATIC_VARIANCE)
+    return risk_model if n is None else risk.subset(risk_model,n)
+
+
+def portfolio_variance(x):
+    """
+    Variance of returns of portfolio x, see problem_risk.
+    """
+    
+    import risk
+    return risk.variance(x,problem_risk(len(x)))
+
+
 def f(x):
     """
     Multiobjective portfolio optimization problem.
@@ -32,6 +166,7 @@ def f(x):
 
     Returns
     -------
+    np.array
         objective function values.
     
     Examples
@@ -45,12 +180,28 @@ def f(x):
 
     """
     
-    indeces = [i for i in range(len(x))]
-    values = []
-    for v in range(4): # first four objectives to maximize
-        values.append(sum([x_i*company_values(i)[v] for x_i,i in zip(x,indeces)]))
-    values.append(sum([x_i*company_values(i)[4] for x_i,i in zip(x,indeces)]))
-    return values
+    # x includes weights for the first len(x) companies
+    x = np.asarray(x, dtype=float)
+    return x @ problem_data()[0][:len(x)]
+
+
+def f_jac(x):
+    """
+    Jacobian of the objective functions f.
+
+    Parameters
+    ----------
+    x : list
+        decision variables.
+
+    Returns
+    -------
+    np.array
+        5 x n matrix of partial derivatives, constant since objectives are linear.
+
+    """
+    
+    return problem_data()[0][:len(x)].T
 
 
 def beta(company_i):
@@ -75,7 +226,7 @@ def beta(company_i):
     """
     
     try:
-        return data.iloc[company_i]['Beta']
+        return problem_data()[1][company_i]
     except IndexError:
         print("Invalid company index.")
         return
@@ -104,16 +255,188 @@ def company_values(company_i):
 
     """
     
-    if company_i > len(data):
+    values = problem_data()[0]
+    if company_i > len(values):
         print('index out of bounds for company')
         return np.zeros(5)
     
-    company = data.iloc[company_i]
-    return [company['Expected return'], company['ESG score'], company['Dividend yield'], \
-           sum([company['Clean200'],company['ScienceBasedTargets']]),company['P/E']]
+    return list(values[company_i])
+
+
+def constraints(n, b_tol, betas=None, max_variance=None, model=None):
+    """
+    Constraints of the problem in form accepted by scipy.optimize.minimize.
+
+    Parameters
+    ----------
+    n : int
+        number of companies.
+    b_tol : float
+        tolerance for beta constraint.
+    betas : np.array, optional
+        betas of companies, by default the first n values of beta_vector.
+    max_variance : float, optional
+        upper bound for variance of the portfolio. By default, variance is 
+        not constrained.
+    model : risk.RiskModel, optional
+        risk model of the companies, by default problem_risk(n).
+
+    Returns
+    -------
+    tuple
+        constraint dictionaries, including exact Jacobians.
+
+    """
+    
+    if betas is None:
+        betas = problem_data()[1][:n]
+    ones = np.ones(n)
+    cons = (
+         # sum of weights = 1
+         {'type':'eq','fun':lambda x: 1-np.sum(x),'jac':lambda x: -ones}, 
+         
+         # sum of beta = 1
+         # transforming a strict equality constraint into two inequality constraints, 
+         # to relax the constraint.
+         {'type':'ineq','fun': lambda x: 1+b_tol-betas @ x,'jac':lambda x: -betas}, 
+         {'type':'ineq','fun': lambda x: betas @ x-1+b_tol,'jac':lambda x: betas}
+        )
+    if max_variance is None:
+        return cons
+    
+    # variance of portfolio <= max_variance, evaluated through factor exposures
+    import risk
+    if model is None:
+        model = problem_risk(n)
+    return cons + (
+         {'type':'ineq','fun': lambda x: max_variance-risk.variance(x,model),
+          'jac': lambda x: -risk.variance_jac(x,model)},
+        )
+
+
+def lp_constraints(n, b_tol, betas=None):
+    """
+    Constraints of the problem in matrix form accepted by scipy.optimize.linprog.
+
+    Parameters
+    ----------
+    n : int
+        number of companies.
+    b_tol : float
+        tolerance for beta constraint.
+    betas : np.array, optional
+        betas of companies, by default the first n values of beta_vector.
+
+    Returns
+    -------
+    A_ub, b_ub : np.array
+        inequality constraints A_ub @ x <= b_ub, beta within 1 +- b_tol.
+    A_eq, b_eq : np.array
+        equality constraint A_eq @ x == b_eq, sum of weights = 1.
+
+    """
+    
+    if betas is None:
+        betas = problem_data()[1][:n]
+    A_ub = np.vstack([betas, -betas])
+    b_ub = np.array([1+b_tol, -(1-b_tol)])
+    A_eq = np.ones((1,n))
+    b_eq = np.array([1.0])
+    return A_ub, b_ub, A_eq, b_eq
+
+
+def optimize_objective(values, betas, obj_i, x, b_tol, method='slsqp', stats=None,
+                       max_variance=None, model=None):
+    """
+    Optimize a single objective subject to the constraints of the problem.
+    
+    The first four objectives are maximized and the fifth, p/e ratio, minimized.
+
+    Parameters
+    ----------
+    values : np.array
+        n x 5 objective matrix.
+    betas : np.array
+        betas of companies.
+    obj_i : int
+        index of objective to be optimized.
+    x : list
+        starting point.
+    b_tol : float
+        tolerance for beta constraint.
+    method : str
+        'slsqp' or 'lp'.
+    stats : instrumentation.Stats, optional
+        collects evaluation and iteration counts.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, see constraints. Not 
+        supported by method 'lp'.
+    model : risk.RiskModel, optional
+        risk model of the companies, for max_variance.
+
+    Returns
+    -------
+    np.array
+        decision variables at the optimum.
+
+    """
+    
+    n = len(x)
+    sign = -1 if obj_i < 4 else 1
+    # objective coefficients as a contiguous row, SLSQP does not cope with 
+    # strided gradient arrays
+    c = sign*np.ascontiguousarray(values[:,obj_i])
+    
+    if method == 'lp':
+        if max_variance is not None:
+            raise ValueError("Variance constraint is not linear, use method 'slsqp'")
+        from scipy.optimize import linprog
+        A_ub, b_ub, A_eq, b_eq = lp_constraints(n,b_tol,betas)
+        res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                      bounds=(0,1), method='highs')
+        if not res.success:
+            raise ValueError("Optimizing " + objectives[obj_i] + " failed: " + res.message)
+        if stats is not None:
+            stats.add_iterations('ideal',res.nit)
+        return res.x
+    
+    from scipy.optimize import minimize
+    res=minimize(
+        counted(stats,lambda x: c @ x,'objective'), x, method='SLSQP'
+        # objectives are linear, so the Jacobian is exact
+        ,jac=counted(stats,lambda x: c,'objective jacobian')
+        ,options = {'disp':False, 'ftol': 1e-20, 'maxiter': 1000}
+        ,bounds = [(0,1)]*n
+        ,constraints = counted_constraints(stats,constraints(n,b_tol,betas,max_variance,model)))
+    if stats is not None:
+        stats.add_iterations('ideal',res.nit)
+    return res.x
+
+
+# objective matrix, betas and risk model shared with worker processes, see calculate_ideal
+_shared = {}
+
+
+def _init_worker(values, betas, model=None):
+    """
+    Store problem data in a worker process, once per process instead of once per task.
+    """
+    
+    _shared['values'] = values
+    _shared['betas'] = betas
+    _shared['model'] = model
+
+
+def _optimize_shared(obj_i, x, b_tol, method, max_variance=None):
+    """
+    Optimize a single objective in a worker process, using the shared problem data.
+    """
+    
+    return optimize_objective(_shared['values'],_shared['betas'],obj_i,x,b_tol,method,
+                              max_variance=max_variance,model=_shared['model'])
 
         
-def calculate_ideal(f,x,b_tol):
+def calculate_ideal(f,x,b_tol,method='slsqp',workers=None,stats=None,max_variance=None):
     """
     Function for calculating the ideal vector for multiobjective problem f.
     
@@ -121,63 +444,133 @@ def calculate_ideal(f,x,b_tol):
         f(list): Objective functions
         x(list): Starting point
         b_tol(float) : Tolerance for beta constraint.
+        method(str) : 'slsqp' for nonlinear optimization of each objective, 
+                      'lp' for solving each objective as a linear program.
+        workers(int) : Number of processes optimizing the objectives in parallel. 
+                       By default, objectives are optimized one after another.
+        stats(instrumentation.Stats) : Collects evaluation and iteration counts, 
+                                       when objectives are optimized one after another.
+        max_variance(float) : Upper bound for variance of the portfolio, only with 
+                              method 'slsqp'. By default, variance is not constrained.
         
     Returns:
         ideal,value(np.array,float): Ideal vector and values of f at the ideal point.
     """
     
-    # initialize for five objectives
-    ideal = [0]*5
-    # bounds for decision variables
-    b = [(0,1)]*len(x)
-    # constraint
-    betas = np.array([beta(c) for c in range(len(x))])
-    t = b_tol # tolerance for beta constraint
-    c = (
-         # sum of weights = 1
-         {'type':'eq','fun':lambda x: 1-sum(x)}, 
-         
-         # sum of beta = 1
-         # transforming a strict equality constraint into two inequality constraints, 
-         # to relax the constraint.
-         {'type':'ineq','fun': lambda x: 1+t-sum(np.array(x)*betas)}, 
-         {'type':'ineq','fun': lambda x: sum(np.array(x)*betas)-1+t}
-        )
-
+    if method not in ('slsqp','lp'):
+        raise ValueError("Unknown method for calculating ideal vector: " + str(method))
+    
+    values, betas = problem_data()
+    values, betas = values[:len(x)], betas[:len(x)]
+    model = None if max_variance is None else problem_risk(len(x))
+    obj_indeces = range(len(objectives))
+    
+    if workers is None or workers < 2:
+        xs = [optimize_objective(values,betas,i,x,b_tol,method,stats,max_variance,model) 
+              for i in obj_indeces]
+    else:
+        # workers get the objective matrix, betas and risk model once, at start-up
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(values,betas,model)) as pool:
+            xs = list(pool.map(_optimize_shared, obj_indeces, [x]*len(obj_indeces),
+                               [b_tol]*len(obj_indeces), [method]*len(obj_indeces),
+                               [max_variance]*len(obj_indeces)))
+    
     #list for storing the actual solutions, which give the ideal
-    solutions = [] 
-    starting_point = x
-    
-    # maximize the first four objectives
-    for i in range(4):
-        res=minimize(
-            # maximize each objective at the time
-            lambda x: -f(x)[i], starting_point, method='SLSQP'
-            # use of Jacobian resulted in worse results
-            #,jac=ad.gh(lambda x: f(x)[i])[0]
-            ,options = {'disp':False, 'ftol': 1e-20, 'maxiter': 1000}
-            ,bounds = b
-            ,constraints = c)
-        solutions.append(f(res.x))
-        ideal[i]=res.fun
-    
-    # switch the signs 
-    ideal = [x*-1 for x in ideal]
-    
-    # minimize the fifth objective, p/e ratio
-    res=minimize(
-        lambda x: f(x)[4], starting_point, method='SLSQP'
-        #Jacobian using automatic differentiation
-        #,jac=ad.gh(lambda x: f(x)[i])[0]
-        ,options = {'disp':False, 'ftol': 1e-20, 'maxiter': 1000}
-        ,bounds = b
-        ,constraints = c)
-    solutions.append(f(res.x))
-    ideal[4]=res.fun
+    solutions = [f(xi) for xi in xs]
+    ideal = [s[i] for i,s in zip(obj_indeces,solutions)]
            
     return ideal,solutions
 
 
+def calculate_nadir(solutions):
+    """
+    Estimate the nadir vector from payoff table.
+    
+    Nadir vector is put together from each of the objective function's "worst" 
+    value in the table.
+
+    Parameters
+    ----------
+    solutions : list
+        payoff table, values of objectives at the solutions of calculate_ideal.
+
+    Returns
+    -------
+    z_nadir : list
+        nadir vector.
+
+    """
+    
+    table = np.transpose(solutions)
+    # minimums of first four objectives    
+    z_nadir = [min(table[s]) for s in range(len(solutions)-1)]
+    # maximum of last objective
+    z_nadir.append(max(table[-1]))
+    return z_nadir
+
+
+def ideal_and_nadir(f,x,b_tol,method='slsqp',workers=None,use_cache=False,stats=None,
+                    max_variance=None):
+    """
+    Calculate ideal and nadir vectors, or read them from disk cache.
+
+    Parameters
+    ----------
+    f : function
+        objective functions.
+    x : list
+        starting point.
+    b_tol : float
+        tolerance for beta constraint.
+    method : str
+        method for calculating ideal vector, 'slsqp' or 'lp'.
+    workers : int, optional
+        number of processes for calculating ideal vector in parallel.
+    use_cache : bool
+        read and store the vectors in disk cache, see payoff_cache.
+    stats : instrumentation.Stats, optional
+        collects timers of phases 'ideal' and 'cache', and evaluation counts.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, see calculate_ideal.
+
+    Returns
+    -------
+    z_ideal : list
+        ideal vector.
+    z_nadir : list
+        nadir vector.
+    solutions : list
+        payoff table.
+
+    """
+    
+    cache_params = {'n':len(x), 'b_tol':b_tol, 'method':method}
+    if max_variance is not None:
+        # the payoff table depends on the risk model too: on the index
+        # histories and idiosyncratic variance it was built from
+        problem_risk()
+        cache_params['max_variance'] = max_variance
+        cache_params['risk'] = risk_inputs
+    use_cache = use_cache and DATA_PATH is not None
+    cached = None
+    if use_cache:
+        with phase(stats,'cache'):
+            cached = payoff_cache.load(DATA_PATH,cache_params)
+    if cached is not None:
+        if stats is not None:
+            stats.count('cache hit')
+        return cached
+    
+    with phase(stats,'ideal'):
+        z_ideal, solutions = calculate_ideal(f,x,b_tol,method,workers,stats,max_variance)
+        z_nadir = calculate_nadir(solutions)
+    if use_cache:
+        with phase(stats,'cache'):
+            payoff_cache.store(DATA_PATH,cache_params,z_ideal,z_nadir,solutions)
+    return z_ideal, z_nadir, solutions
+
+
 def f_normalized(x,i,n):
     """
     Returns the values of normalized objective functions at point x.
@@ -188,15 +581,30 @@ def f_normalized(x,i,n):
         z(list): nadir vector
         
     Returns:
-        (float): Values of objective functions.
+        (np.array): Values of objective functions.
     """
     
-    z = f(x)
-    return [(zi-zideali)/(znadiri-zideali) for 
-            (zi,zideali,znadiri) in zip(z,i,n)]
+    return (f(x)-np.asarray(i))/(np.asarray(n)-np.asarray(i))
 
 
-def asf(f,ref,b_tol,x_start,z_ideal,z_nadir,rho):
+def f_normalized_jac(x,i,n):
+    """
+    Returns the Jacobian of normalized objective functions at point x.
+    
+    Args:
+        x(np.array): Values of x.
+        i(list): ideal vector
+        z(list): nadir vector
+        
+    Returns:
+        (np.array): 5 x n matrix of partial derivatives.
+    """
+    
+    return f_jac(x)/(np.asarray(n)-np.asarray(i))[:,None]
+
+
+def asf(f,ref,b_tol,x_start,z_ideal,z_nadir,rho,f_jac=f_normalized_jac,method='slsqp',
+        disp=True,stats=None,max_variance=None):
     """
     Implementation of achievement scalarizing function.
 
@@ -216,6 +624,18 @@ def asf(f,ref,b_tol,x_start,z_ideal,z_nadir,rho):
         nadir vector.
     rho : float
         augmentation parameter.
+    f_jac : function
+        Jacobian of objective functions, used for the (sub)gradient of asf.
+    method : str
+        'slsqp' for minimizing asf directly, 'lp' for solving it as a 
+        linear program, see asf_lp.
+    disp : bool
+        print convergence messages of slsqp.
+    stats : instrumentation.Stats, optional
+        collects evaluation and iteration counts.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, only with method 'slsqp'. 
+        By default, variance is not constrained.
 
     Returns
     -------
@@ -227,47 +647,107 @@ def asf(f,ref,b_tol,x_start,z_ideal,z_nadir,rho):
 
     """
     
+    if method == 'lp':
+        if max_variance is not None:
+            raise ValueError("Variance constraint is not linear, use method 'slsqp'")
+        return asf_lp(f,ref,b_tol,x_start,z_ideal,z_nadir,rho,f_jac,stats)
+    elif method != 'slsqp':
+        raise ValueError("Unknown method for achievement scalarizing function: " + str(method))
+    
     # bounds and constraints
     b = [(0,1)]*len(x_start)
-    betas = [beta(c) for c in range(len(x_start))]
-    t = b_tol # tolerance for beta constraint
-    
-    c = (
-         # sum of weights = 1
-         {'type':'eq','fun':lambda x: 1-sum(x)}, 
-         
-         # sum of beta = 1
-         # transforming a strict equality constraint into two inequality constraints, 
-         # to relax the constraint.
-         {'type':'ineq','fun': lambda x: 1+t-sum(np.array(x)*betas)}, 
-         {'type':'ineq','fun': lambda x: sum(np.array(x)*betas)-1+t}
-        )
+    c = counted_constraints(stats,constraints(len(x_start),b_tol,max_variance=max_variance))
     
     # normalizing the reference point
-    ref_norm = [(refi-z_ideali)/(z_nadiri-z_ideali) 
-                for (refi,z_ideali,z_nadiri) in zip(ref,z_ideal,z_nadir)]
+    ref_norm = np.array([(refi-z_ideali)/(z_nadiri-z_ideali) 
+                for (refi,z_ideali,z_nadiri) in zip(ref,z_ideal,z_nadir)])
     
     # scalarized function
     def obj(x):
-        return np.max(np.array(f(x,z_ideal,z_nadir))-ref_norm)\
-           +rho*np.sum(f(x,z_ideal,z_nadir))
+        z = f(x,z_ideal,z_nadir)
+        return np.max(z-ref_norm)+rho*np.sum(z)
     
+    # subgradient of scalarized function: gradient of the active (maximal) 
+    # term plus the augmentation term
+    def obj_jac(x):
+        z = f(x,z_ideal,z_nadir)
+        jac = f_jac(x,z_ideal,z_nadir)
+        return jac[np.argmax(z-ref_norm)]+rho*np.sum(jac,axis=0)
+    
+    from scipy.optimize import minimize
     start = x_start
     res=minimize(
         #Objective function defined above
-        obj, 
+        counted(stats,obj,'objective'), 
         start, method='SLSQP'
-        #Jacobian using automatic differentiation
-        ,jac=ad.gh(obj)[0]
+        #analytic Jacobian of linear objectives
+        ,jac=counted(stats,obj_jac,'objective jacobian')
         #bounds given above
         ,bounds = b
         ,constraints = c
-        ,options = {'disp':True, 'ftol': 1e-20,
+        ,options = {'disp':disp, 'ftol': 1e-20,
                 'maxiter': 1000})
+    if stats is not None:
+        stats.add_iterations('asf',res.nit)
     return res
 
 
-def solve_problem(f,x_start,ref,b_tol):
+def asf_lp(f,ref,b_tol,x_start,z_ideal,z_nadir,rho,f_jac=f_normalized_jac,stats=None):
+    """
+    Achievement scalarizing function solved as a linear program.
+    
+    Normalized objectives are linear, so the non-smooth max-term of asf can be 
+    replaced with an auxiliary variable t bounding each of its terms:
+        
+        min  t + rho*sum(f(x))
+        s.t. f_i(x) - ref_i <= t, for each objective i
+        
+    subject to the constraints of the problem. Arguments are the same as for asf.
+
+    Returns
+    -------
+    scipy.optimize.optimize.OptimizeResult
+        result of optimization, x including decision variables only.
+
+    """
+    
+    n = len(x_start)
+    
+    # f(x) = J @ x + z0, linear in x
+    J = np.asarray(f_jac(x_start,z_ideal,z_nadir))
+    z0 = np.asarray(f(x_start,z_ideal,z_nadir)) - J @ np.asarray(x_start)
+    
+    # normalizing the reference point
+    ref_norm = np.array([(refi-z_ideali)/(z_nadiri-z_ideali) 
+                for (refi,z_ideali,z_nadiri) in zip(ref,z_ideal,z_nadir)])
+    
+    # variables [x, t]
+    c = np.append(rho*np.sum(J,axis=0), 1)
+    A_ub, b_ub, A_eq, b_eq = lp_constraints(n,b_tol)
+    A_ub = np.vstack([np.column_stack([A_ub, np.zeros(len(A_ub))]),
+                      # J @ x + z0 - ref_norm <= t
+                      np.column_stack([J, -np.ones(len(J))])])
+    b_ub = np.concatenate([b_ub, ref_norm-z0])
+    A_eq = np.column_stack([A_eq, np.zeros(len(A_eq))])
+    bounds = [(0,1)]*n + [(None,None)]
+    
+    from scipy.optimize import OptimizeResult, linprog
+    res = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+                  bounds=bounds, method='highs')
+    if stats is not None:
+        stats.add_iterations('asf',res.nit)
+    if not res.success:
+        return OptimizeResult(x=np.asarray(x_start,dtype=float), fun=np.nan, 
+                              success=False, status=res.status, 
+                              message=res.message, nit=res.nit)
+    
+    x = res.x[:n]
+    return OptimizeResult(x=x, fun=res.fun+rho*np.sum(z0), success=True, 
+                          status=res.status, message=res.message, nit=res.nit)
+
+
+def solve_problem(f,x_start,ref,b_tol,ideal_method='slsqp',workers=None,use_cache=False,
+                  asf_method='slsqp',stats=None,max_variance=None):
     """
     Solve the multiobjective portfolio problem.
 
@@ -281,16 +761,35 @@ def solve_problem(f,x_start,ref,b_tol):
         reference point provided by decision maker.
     b_tol : float
         tolerance for beta constraint.
+    ideal_method : str
+        method for calculating ideal vector, 'slsqp' or 'lp'.
+    workers : int, optional
+        number of processes for calculating ideal vector in parallel.
+    use_cache : bool
+        if True, ideal and nadir vectors are read from disk cache when 
+        calculated before for the same data and parameters, see payoff_cache.
+    asf_method : str
+        method for solving achievement scalarizing function, 'slsqp' or 'lp'.
+    stats : instrumentation.Stats, optional
+        collects timers of phases, evaluation and iteration counts. Phases can 
+        be profiled with it, see instrumentation.
+    max_variance : float, optional
+        upper bound for variance of the portfolio, estimated with a factor 
+        model, see risk. Only with methods 'slsqp'.
 
     Returns
     -------
     scipy.optimize.optimize.OptimizeResult
-        result of optimization.
+        result of optimization, including stats as attribute stats.
 
     """
     
+    if stats is None:
+        stats = Stats()
+    
     # 1. calculation of ideal and nadir vectors    
-    z_ideal, solutions= calculate_ideal(f,x_start,b_tol)
+    z_ideal, z_nadir, solutions = ideal_and_nadir(f,x_start,b_tol,ideal_method,
+                                                  workers,use_cache,stats,max_variance)
     print ("Ideal vector:\n"+str(z_ideal))
     
     print("\n === Estimation of Nadir vector === ")
@@ -301,31 +800,31 @@ def solve_problem(f,x_start,ref,b_tol):
     
     print("\nNadir vector is put together from each of the objective function's \"worst\" \
           value in the table")
-    
-    # minimums of first four objectives    
-    z_nadir = [min(np.transpose(solutions)[s]) for s in range(len(solutions)-1)]           
-    
-    # maximum of last objective
-    z_nadir.append(max(np.transpose(solutions)[-1]))
     print("Nadir vector:\n",z_nadir)
     
     # 2. normalizing the objective functions
     print("\nAfter normalizing the objective functions using ideal- and nadir-vectors:")
-    print("normalized value for the problem at " + str(x0) + " is")
-    print(f_normalized(x0,z_ideal,z_nadir))
+    print("normalized value for the problem at " + str(x_start) + " is")
+    print(f_normalized(x_start,z_ideal,z_nadir))
     
     # 3. solving the problem   
     print("\n=== SOLUTION ===")
     rho = 0.000001
-    res = asf(f_normalized,ref,tol,x0,z_ideal,z_nadir,rho)
+    with stats.phase('asf'):
+        res = asf(f_normalized,ref,b_tol,x_start,z_ideal,z_nadir,rho,method=asf_method,
+                  stats=stats,max_variance=max_variance)
+    res.stats = stats
     print("Proportional amounts to invest in companies are:\n")
-    for c in range(len(x0)):
-        print(data['Company'].values[c] + " : " + str(res.x[c]))
+    names = np.asarray(data['Company'])
+    for c in range(len(x_start)):
+        print(names[c] + " : " + str(res.x[c]))
         
     print("\nObjective function values are:\n")
     for i in range(len(objectives)):
         print(objectives[i] + " : " + str(f(res.x)[i]))
-    print("Portfolio beta : ",sum(res.x[i]*beta(i) for i in range(len(res.x))))
+    print("Portfolio beta : ",problem_data()[1][:len(res.x)] @ res.x)
+    if max_variance is not None:
+        print("Portfolio variance : ",portfolio_variance(res.x))
     print("Ideal vector: " +str(z_ideal))
     print("Sum of weights : ",sum(res.x))
     if sum(res.x) < 1+0.000000001:
@@ -335,8 +834,107 @@ def solve_problem(f,x_start,ref,b_tol):
     return res
     
 
-n = 30
-x0 = [1/n]*n # start with equal weights
-ref = [0.1,0.5,3,1,15]
-tol = 0.1 # tolerance for beta constraint
-solve_problem(f,x0,ref,tol)
\ No newline at end of file
+def _init_batch_worker(values, betas):
+    """
+    Set the problem data of a worker process solving reference points, see 
+    solve_batch. Workers do not inherit the data set in the parent process 
+    unless they are forked.
+    """
+    
+    global obj_matrix, beta_vector
+    obj_matrix, beta_vector = values, betas
+
+
+def _solve_sequence(refs,b_tol,x_start,z_ideal,z_nadir,rho,asf_method):
+    """
+    Solve reference points one after another, each warm-started from the 
+    solution of the nearest reference point solved before it.
+    """
+    
+    # distances between reference points are measured in normalized space
+    refs_norm = (np.asarray(refs)-np.asarray(z_ideal))/(np.asarray(z_nadir)-np.asarray(z_ideal))
+    X = np.zeros((len(refs),len(x_start)))
+    for k in range(len(refs)):
+        start = x_start
+        if k > 0:
+            nearest = np.argmin(np.linalg.norm(refs_norm[:k]-refs_norm[k],axis=1))
+            start = X[nearest]
+        res = asf(f_normalized,refs[k],b_tol,start,z_ideal,z_nadir,rho,
+                  method=asf_method,disp=False)
+        X[k] = res.x
+    return X
+
+
+def solve_batch(refs,b_tol,x_start,ideal_method='lp',asf_method='slsqp',workers=None,
+                use_cache=False,rho=0.000001):
+    """
+    Solve the multiobjective portfolio problem for multiple reference points.
+    
+    Ideal and nadir vectors are calculated once for all reference points. Each 
+    solve is started from the solution of the nearest reference point solved before.
+
+    Parameters
+    ----------
+    refs : np.array
+        m x 5 matrix, each row a reference point.
+    b_tol : float
+        tolerance for beta constraint.
+    x_start : list
+        starting values for decision variables, for the first reference point. 
+        Its length sets the number of companies.
+    ideal_method : str
+        method for calculating ideal vector, 'slsqp' or 'lp'.
+    asf_method : str
+        method for solving achievement scalarizing function, 'slsqp' or 'lp'.
+    workers : int, optional
+        number of processes. Reference points are split into as many chunks, 
+        solved in parallel, warm starts being used within each chunk.
+    use_cache : bool
+        read ideal and nadir vectors from disk cache, see payoff_cache.
+    rho : float
+        augmentation parameter.
+
+    Returns
+    -------
+    X : np.array
+        m x n matrix, proportional amounts to invest in companies for each reference point.
+    Z : np.array
+        m x 5 matrix, objective function values of the solutions.
+
+    """
+    
+    refs = np.atleast_2d(np.asarray(refs,dtype=float))
+    
+    z_ideal, z_nadir, solutions = ideal_and_nadir(f,x_start,b_tol,ideal_method,
+                                                  workers,use_cache)
+    
+    if workers is None or workers < 2 or len(refs) < 2:
+        X = _solve_sequence(refs,b_tol,x_start,z_ideal,z_nadir,rho,asf_method)
+    else:
+        chunks = np.array_split(refs,min(workers,len(refs)))
+        values, betas = problem_data()
+        n = len(x_start)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(values[:n],betas[:n])) as pool:
+            parts = pool.map(_solve_sequence, chunks, *[[arg]*len(chunks) for arg in 
+                             (b_tol,x_start,z_ideal,z_nadir,rho,asf_method)])
+            X = np.vstack(list(parts))
+    
+    Z = X @ problem_data()[0][:len(x_start)]
+    return X, Z
+
+
+def main():
+    """
+    Solve the problem for the first 30 companies of final_data.csv.
+    """
+    
+    n = 30
+    x0 = [1/n]*n # start with equal weights
+    ref = [0.1,0.5,3,1,15]
+    tol = 0.1 # tolerance for beta constraint
+    solve_problem(f,x0,ref,tol)
+
+
+if __name__ == '__main__':
+    main()
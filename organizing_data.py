@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from concurrent.futures import ProcessPoolExecutor
 import csv
 import collections
+import os
 import numpy as np
 import pandas as pd
 
@@ -14,6 +16,92 @@ Organizing data from multiple sources. Going through different ranking datatable
 them into one.
 """
 
+# common words in company names, not counted as matching words by check_match.
+# Note that 'incorporated' and 'limited' are concatenated into one word.
+COMMON_WORDS = frozenset(['ltd','inc','co','plc','as',\
+                          'ab','spa','nv','corp','se',\
+                          'property','group', 'inc.',\
+                          'corp.','corporation','incorporated'\
+                          'limited', 'etf','fund','bond',\
+                          'treasury','sa','global',\
+                          'markets','ag', 'international',\
+                          'holding', 'holdings', 'a/s',\
+                          'bank', 'consumer', 'products',\
+                          'tbk', 'pt', 'asa', 'realty', \
+                          'trust', 'estate', 'investment',\
+                          'banco', 'de', 'del', 'pharmaceutical',\
+                          'ndustries', 'energy', 'grupo', 'sab',\
+                          'oyj', 'oy'])
+
+# pre-tokenized names of a reference table and rows of each significant word
+NameIndex = collections.namedtuple('NameIndex', ['words', 'rows'])
+
+
+def tokenize(name):
+    """
+    Words of a company name, as compared by check_match.
+    """
+    
+    return str(name).strip().lower().split()
+
+
+def name_index(names, common_words=COMMON_WORDS):
+    """
+    Build an inverted index of company names, from words to rows containing them.
+    
+    Names are tokenized once. Common words are left out of the index, since 
+    check_match requires at least one matching word that is not common.
+
+    Parameters
+    ----------
+    names : list
+        company names of reference table.
+    common_words : set
+        common words in company names.
+
+    Returns
+    -------
+    NameIndex
+        words of each name, and rows of each word not in common words.
+
+    """
+    
+    words = [tokenize(n) for n in names]
+    rows = collections.defaultdict(list)
+    for j, w in enumerate(words):
+        for t in set(w).difference(common_words):
+            rows[t].append(j)
+    return NameIndex(words, dict(rows))
+
+
+def matching_rows(index, words, common_words=COMMON_WORDS):
+    """
+    Rows of index whose names match a company name, according to check_match.
+    
+    Only rows sharing a word that is not common are candidates, others can not match.
+
+    Parameters
+    ----------
+    index : NameIndex
+        index of reference table, see name_index.
+    words : list
+        words in company name.
+    common_words : set
+        common words in company names.
+
+    Returns
+    -------
+    list
+        matching rows, in ascending order.
+
+    """
+    
+    candidates = set()
+    for t in set(words).difference(common_words):
+        candidates.update(index.rows.get(t, ()))
+    return [j for j in sorted(candidates) if check_match(words, index.words[j], common_words)]
+
+
 def check_match(word1, word2, common_words):
     """
     Function to test if two company names with minor spelling differences match.
@@ -25,7 +113,7 @@ def check_match(word1, word2, common_words):
     word2 : list
         words in company 2 name.
     common_words: list
-        common words in company names.
+        common words in company names, COMMON_WORDS if empty.
 
     Returns
     -------
@@ -38,29 +126,14 @@ def check_match(word1, word2, common_words):
     i = 0
     if len(word2) > len(word1): i = 1
     
-    # how many similar words
-    matches = set(word1) & set(word2)
-    amount = len(matches)
-    
     # if list of common words is empty, use a default one
     common_w = common_words
     if len(common_w) < 1:
-        common_w = ['ltd','inc','co','plc','as',\
-                    'ab','spa','nv','corp','se',\
-                    'property','group', 'inc.',\
-                    'corp.','corporation','incorporated'\
-                    'limited', 'etf','fund','bond',\
-                    'treasury','sa','global',\
-                    'markets','ag', 'international',\
-                    'holding', 'holdings', 'a/s',\
-                    'bank', 'consumer', 'products',\
-                    'tbk', 'pt', 'asa', 'realty', \
-                    'trust', 'estate', 'investment',\
-                    'banco', 'de', 'del', 'pharmaceutical',\
-                    'ndustries', 'energy', 'grupo', 'sab',\
-                    'oyj', 'oy']
-    for c in common_w:
-        if c in matches: amount-=1
+        common_w = COMMON_WORDS
+    
+    # how many similar words, common words not counted
+    matches = set(word1) & set(word2)
+    amount = len(matches.difference(common_w))
         
     # relation between same words and length of the word    
     result = amount/len(words[i]) # divided with length of longer word
@@ -89,20 +162,105 @@ def check_symbols(df_companies, df_symbols, stock_market):
 
     """
     
-    # for storing informationg about symbols, 
-    symbols = []
-    for i in range(len(df_companies)):
-        symbols.append('na')
-    
-    # going through the company names from the symbols-dataframe
     # common_words = find_common_words(df_companies, stock_market)
-    for i in range(len(df_companies)):
-        r = df_companies['Company'][i].strip().lower().split()
-        for j in range(len(df_symbols)):
-            s = df_symbols['Name'][j].strip().lower().split()
-            if check_match(r,s,[]): symbols[i] = df_symbols['Symbol'][j]
+    index = name_index(df_symbols['Name'])
+    return match_symbols(index, df_symbols['Symbol'].values, df_companies['Company'])
+
+
+def match_symbols(index, symbols, companies):
+    """
+    Find stock symbols of companies.
+
+    Parameters
+    ----------
+    index : NameIndex
+        index of names in symbol list, see name_index.
+    symbols : list
+        symbols of names in index.
+    companies : list
+        company names.
+
+    Returns
+    -------
+    list
+        symbol of each company, 'na' if not found.
+
+    """
+    
+    # going through the company names, comparing them only to names in the 
+    # symbol list sharing a word with them
+    found = ['na']*len(companies)
+    for i, company in enumerate(companies):
+        rows = matching_rows(index, tokenize(company))
+        # the last matching symbol is used
+        if rows: found[i] = symbols[rows[-1]]
+    return found
+
+
+# indeces of symbol lists in a worker process
+_shared = {}
+
+
+def _init_worker(tables):
+    """
+    Index symbol lists in a worker process, once per process instead of once per chunk.
+    """
+    
+    for column, (names, symbols) in tables.items():
+        _shared[column] = (name_index(names), symbols)
+
+
+def _match_chunk(column, companies):
+    """
+    Find symbols of a chunk of companies in a worker process.
+    """
+    
+    index, symbols = _shared[column]
+    return match_symbols(index, symbols, companies)
+
+
+def resolve_symbols(df_companies, symbol_tables, workers=None, chunk_size=200):
+    """
+    Find stock symbols of companies from multiple stock markets' symbol lists.
+    
+    With workers, company list is split into chunks, and the chunks of all 
+    stock markets are resolved concurrently in a process pool. Results are 
+    the same as with check_symbols for each stock market.
+
+    Parameters
+    ----------
+    df_companies : dataframe
+        company names.
+    symbol_tables : dict
+        dataframes containing company names and stock symbols, keyed by column 
+        name of stock market, e.g. 'Symbol NQ'.
+    workers : int, optional
+        number of processes. By default, stock markets are resolved one after another.
+    chunk_size : int
+        number of companies in a chunk.
+
+    Returns
+    -------
+    dict
+        list of symbols of companies, 'na' if not found, for each stock market.
+
+    """
+    
+    if workers is None or workers < 2:
+        return {column: check_symbols(df_companies, df, column) 
+                for column, df in symbol_tables.items()}
     
-    return symbols
+    companies = [str(c) for c in df_companies['Company']]
+    chunks = [companies[k:k+chunk_size] for k in range(0, len(companies), chunk_size)]
+    tables = {column: (df['Name'].tolist(), df['Symbol'].tolist()) 
+              for column, df in symbol_tables.items()}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(tables,)) as pool:
+        futures = {column: [pool.submit(_match_chunk, column, chunk) for chunk in chunks]
+                   for column in symbol_tables}
+        # merged in order of chunks, so results do not depend on scheduling
+        return {column: [symbol for f in fs for symbol in f.result()] 
+                for column, fs in futures.items()}
     
 
 def check_occurances(df_base, df_c200, df_s):
@@ -132,33 +290,29 @@ def check_occurances(df_base, df_c200, df_s):
     """
     
     # for storing binary data about occurance of company names on clean200 and sciencebasedtarget's rankings
-    clean_bools = np.zeros(len(df_robeco))
-    sbt_bools = np.zeros(len(df_robeco))
+    clean_bools = np.zeros(len(df_base))
+    sbt_bools = np.zeros(len(df_base))
     
     # for storing informationg about companies origin countries, 
     # initializing array of strings full of "na's"
-    countries = []
-    for i in range(len(df_robeco)):
-        countries.append("na")
+    countries = ["na"]*len(df_base)
+    
+    clean_names = set(str(n).strip().lower() for n in df_c200['Short Name'])
+    sbt_index = name_index(df_s['Company Name'])
+    sbt_countries = df_s['Country'].values
            
     # going through all the companies in robecosam's ranking. 
     # storing the information about whether the company name is found in clean200 
     # or sciencebasedtarget's rankings.
-    for i in range(len(df_robeco)):
-        for j in range (len(df_clean)):
-            if df_robeco['Company'][i].strip().lower() == \
-                df_clean['Short Name'][j].strip().lower():
-                    clean_bools[i] = 1
-                    break
+    for i, company in enumerate(df_base['Company']):
+        if company.strip().lower() in clean_names:
+            clean_bools[i] = 1
         
-        # sciencebasedtargets- list
-        r = df_robeco['Company'][i].strip().lower().split()
-        for k in range (len(df_sbt)):
-            s = df_sbt['Company Name'][k].strip().lower().split()
-            if check_match(r,s, []): 
-                sbt_bools[i] = 1
-                countries[i] = df_sbt['Country'][k]
-                break
+        # sciencebasedtargets- list, the first matching company is used
+        rows = matching_rows(sbt_index, tokenize(company))
+        if rows:
+            sbt_bools[i] = 1
+            countries[i] = sbt_countries[rows[0]]
             
     return clean_bools, sbt_bools, countries
 
@@ -209,38 +363,53 @@ def find_common_words(df, stock_market):
         common_words.append(w[0])
     
     return common_words
-              
-# ====================================================================================   
-
-# importing data
-df_clean = pd.read_csv('data/clean200.csv')
-df_robeco = pd.read_csv('data/robecosam.csv')
-df_sbt = pd.read_csv('data/sciencebasedtargets.csv')
-df_symbols_nq = pd.read_csv('data/symbols_nasdaq.csv')
-df_symbols_nyse = pd.read_csv('data/symbols_nyse.csv')
-df_symbols_nordic = pd.read_csv('data/symbols_nasdaq_nordic.csv')
-
-# checking the occurances of companies between three rating lists
-clean_bools, sbt_bools, countries = check_occurances(df_robeco, df_clean, df_sbt)
-
-# finding the stock symbols for companies from stock symbol lists 
-symbols_nq = check_symbols(df_robeco,df_symbols_nq, 'Symbol NQ')
-symbols_nyse = check_symbols(df_robeco,df_symbols_nyse, 'Symbol NYSE')
-symbols_nordic = check_symbols(df_robeco,df_symbols_nordic, 'Symbol NQ North')
-       
-# adding colums to dataframe, containing information about company's 
-# occurance in clean200's and sciencebasedtargets' lists, plus the origin
-# country of the company and stock symbol
-df_robeco['Clean200'] = clean_bools
-df_robeco['ScienceBasedTargets'] = sbt_bools
-df_robeco['Country'] = countries
-df_robeco['Symbol NQ'] = symbols_nq
-df_robeco['Symbol NYSE'] = symbols_nyse
-df_robeco['Symbol NQ_North'] = symbols_nordic
-
-# drop rows for which stock symbol was not found
-df_final = df_robeco.loc[(df_robeco['Symbol NQ'] != 'na') \
-                        |(df_robeco['Symbol NYSE'] != 'na') \
-                        |(df_robeco['Symbol NQ_North'] != 'na')]
-
-df_final.to_csv('data/combined_data.csv')
\ No newline at end of file
+
+
+def main(workers=None):
+    """
+    Combine the ranking lists and stock symbols of companies into combined_data.csv.
+
+    Parameters
+    ----------
+    workers : int, optional
+        number of processes for finding stock symbols, by default number of CPUs.
+
+    """
+    
+    workers = workers or os.cpu_count()
+    
+    # importing data
+    df_clean = pd.read_csv('data/clean200.csv')
+    df_robeco = pd.read_csv('data/robecosam.csv')
+    df_sbt = pd.read_csv('data/sciencebasedtargets.csv')
+    df_symbols_nq = pd.read_csv('data/symbols_nasdaq.csv')
+    df_symbols_nyse = pd.read_csv('data/symbols_nyse.csv')
+    df_symbols_nordic = pd.read_csv('data/symbols_nasdaq_nordic.csv')
+
+    # checking the occurances of companies between three rating lists
+    clean_bools, sbt_bools, countries = check_occurances(df_robeco, df_clean, df_sbt)
+
+    # finding the stock symbols for companies from stock symbol lists 
+    symbols = resolve_symbols(df_robeco, {'Symbol NQ': df_symbols_nq,
+                                          'Symbol NYSE': df_symbols_nyse,
+                                          'Symbol NQ_North': df_symbols_nordic}, workers)
+
+    # adding colums to dataframe, containing information about company's 
+    # occurance in clean200's and sciencebasedtargets' lists, plus the origin
+    # country of the company and stock symbol
+    df_robeco['Clean200'] = clean_bools
+    df_robeco['ScienceBasedTargets'] = sbt_bools
+    df_robeco['Country'] = countries
+    for column in symbols:
+        df_robeco[column] = symbols[column]
+
+    # drop rows for which stock symbol was not found
+    df_final = df_robeco.loc[(df_robeco['Symbol NQ'] != 'na') \
+                            |(df_robeco['Symbol NYSE'] != 'na') \
+                            |(df_robeco['Symbol NQ_North'] != 'na')]
+
+    df_final.to_csv('data/combined_data.csv')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+"""
+Pareto dominance of objective vectors.
+
+"""
+
+# first four objectives are maximized, p/e ratio minimized
+MAXIMIZE = [True, True, True, True, False]
+
+
+def dominates(a, b, maximize=MAXIMIZE):
+    """
+    Check whether objective vector a Pareto dominates objective vector b.
+
+    Parameters
+    ----------
+    a : np.array
+        objective vector.
+    b : np.array
+        objective vector.
+    maximize : list
+        for each objective, True if maximized and False if minimized.
+
+    Returns
+    -------
+    bool
+        True if a is at least as good as b in all objectives and better in at least one.
+
+    """
+
+    sign = np.where(maximize, 1, -1)
+    a, b = sign*np.asarray(a), sign*np.asarray(b)
+    return bool(np.all(a >= b) and np.any(a > b))
+
+
+def nondominated(F, maximize=MAXIMIZE):
+    """
+    Find nondominated objective vectors.
+
+    Parameters
+    ----------
+    F : np.array
+        m x k matrix, each row an objective vector.
+    maximize : list
+        for each objective, True if maximized and False if minimized.
+
+    Returns
+    -------
+    np.array
+        boolean mask of rows of F which no other row dominates.
+
+    """
+
+    # as maximization problem
+    G = np.asarray(F, dtype=float)*np.where(maximize, 1, -1)
+    mask = np.ones(len(G), dtype=bool)
+    for i in range(len(G)):
+        if not mask[i]:
+            continue
+        # rows dominated by row i
+        dominated = np.all(G[i] >= G, axis=1) & np.any(G[i] > G, axis=1)
+        mask[dominated] = False
+    return mask
+
+
+def nondominated_sort(F, maximize=MAXIMIZE):
+    """
+    Sort objective vectors into nondominated layers.
+
+    The first layer includes the nondominated vectors, the second the vectors
+    nondominated once the first layer is removed, and so on.
+
+    Parameters
+    ----------
+    F : np.array
+        m x k matrix, each row an objective vector.
+    maximize : list
+        for each objective, True if maximized and False if minimized.
+
+    Returns
+    -------
+    np.array
+        layer of each row of F, starting from 0.
+
+    """
+
+    F = np.asarray(F, dtype=float)
+    layers = np.full(len(F), -1)
+    remaining = np.arange(len(F))
+    layer = 0
+    while remaining.size:
+        mask = nondominated(F[remaining], maximize)
+        layers[remaining[mask]] = layer
+        remaining = remaining[~mask]
+        layer += 1
+    return layers
+
+
+def screen(F, betas, upper=1.0, maximize=MAXIMIZE, block=1 << 20):
+    """
+    Find assets which can be left out of a portfolio problem without changing
+    the optimal values of its objectives.
+
+    The problem is assumed to have linear objectives F, and constraints
+    sum(x) = 1, 0 <= x <= upper and bounds for portfolio beta, betas @ x. An
+    asset is left out if it is dominated by at least ceil(1/upper) kept assets
+    with beta at most its beta, and by at least as many with beta at least its
+    beta. The weight of such an asset in any feasible portfolio can then be
+    moved to its dominators, keeping the sum of weights and the beta of the
+    portfolio the same and all weights within bounds, without making any
+    objective worse. Assets are screened layer by layer (see
+    nondominated_sort), the first layer always kept.
+
+    Other constraints, e.g. bounds for variance of the portfolio, are not
+    taken into account.
+
+    Parameters
+    ----------
+    F : np.array
+        n x k objective matrix, each row objective values of an asset.
+    betas : np.array
+        betas of assets.
+    upper : float
+        upper bound for weight of an asset.
+    maximize : list
+        for each objective, True if maximized and False if minimized.
+    block : int
+        maximum number of asset pairs compared at a time, limiting memory use.
+
+    Returns
+    -------
+    keep : np.array
+        boolean mask of assets kept.
+    layers : np.array
+        nondominated layer of each asset.
+
+    """
+
+    G = np.asarray(F, dtype=float)*np.where(maximize, 1, -1)
+    betas = np.asarray(betas, dtype=float)
+    # dominators needed on each side of beta of an asset, so that they can 
+    # take all of its weight within the upper bound
+    required = int(np.ceil(round(1/upper, 9)))
+    layers = nondominated_sort(F, maximize)
+    keep = layers == 0
+
+    for layer in range(1, layers.max()+1 if len(layers) else 0):
+        rows = np.flatnonzero(layers == layer)
+        kept = np.flatnonzero(keep)
+        step = max(1, block//max(1, len(kept)))
+        for start in range(0, len(rows), step):
+            r = rows[start:start+step]
+            # dom[a,b]: kept asset b dominates asset r[a]
+            dom = (np.all(G[kept][None,:,:] >= G[r][:,None,:], axis=2)
+                   & np.any(G[kept][None,:,:] > G[r][:,None,:], axis=2))
+            below = np.sum(dom & (betas[kept][None,:] <= betas[r][:,None]), axis=1)
+            above = np.sum(dom & (betas[kept][None,:] >= betas[r][:,None]), axis=1)
+            keep[r] = (below < required) | (above < required)
+    return keep, layers
+
+
+def screening_report(keep, layers):
+    """
+    Number of assets in each nondominated layer, and number of them left out.
+
+    Parameters
+    ----------
+    keep : np.array
+        boolean mask of assets kept, from screen.
+    layers : np.array
+        nondominated layer of each asset, from screen.
+
+    Returns
+    -------
+    list
+        (layer, assets, removed) for each layer.
+
+    """
+
+    return [(layer, int(np.sum(layers == layer)), int(np.sum((layers == layer) & ~keep)))
+            for layer in range(layers.max()+1 if len(layers) else 0)]
+
+
+def print_screening(keep, layers):
+    """
+    Print the number of assets left out, in total and of each nondominated layer.
+
+    Parameters
+    ----------
+    keep : np.array
+        boolean mask of assets kept, from screen.
+    layers : np.array
+        nondominated layer of each asset, from screen.
+
+    """
+
+    print("Screening left out " + str(int(np.sum(~keep))) + " of " + str(len(keep))
+          + " companies (layer: companies, left out):")
+    for layer, size, removed in screening_report(keep, layers):
+        print("  " + str(layer+1) + ": " + str(size) + ", " + str(removed))
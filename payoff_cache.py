@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import numpy as np
+
+"""
+Disk cache for ideal and nadir vectors of the reference point method.
+
+Calculation of the payoff table is the most expensive phase of the reference point
+method, but it depends only on the company data and on the solve parameters
+(number of companies, tolerance for beta, method). Entries are keyed by a hash of
+the contents of the data file plus the parameters, so a changed data file never
+hits old entries, and the entries computed from its previous contents are removed.
+Size of the cache is bounded, least recently used entries are evicted first.
+
+"""
+
+CACHE_DIR = 'data/cache'
+MAX_ENTRIES = 32
+
+# fingerprints of files, keyed by path, modification time and size
+_fingerprints = {}
+
+
+def fingerprint(path):
+    """
+    Hash of the contents of a file.
+
+    Parameters
+    ----------
+    path : str
+        path to file.
+
+    Returns
+    -------
+    str
+        sha256 hex digest of file contents.
+
+    """
+
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _fingerprints:
+        h = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                h.update(chunk)
+        _fingerprints[key] = h.hexdigest()
+    return _fingerprints[key]
+
+
+def _path_tag(data_path):
+    """
+    Short tag identifying the data file in names of cache entries.
+    """
+
+    return hashlib.sha256(os.path.abspath(data_path).encode('utf-8')).hexdigest()[:12]
+
+
+def _entry(data_path, params, cache_dir):
+    """
+    Path of cache entry for given data file and solve parameters.
+    """
+
+    params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8'))
+    name = '_'.join([_path_tag(data_path),
+                     fingerprint(data_path)[:16],
+                     params_hash.hexdigest()[:16]])
+    return os.path.join(cache_dir, name + '.npz')
+
+
+def _entries(cache_dir):
+    """
+    Paths of all cache entries.
+    """
+
+    if not os.path.isdir(cache_dir):
+        return []
+    return [os.path.join(cache_dir, e) for e in os.listdir(cache_dir) if e.endswith('.npz')]
+
+
+def invalidate(data_path, cache_dir=CACHE_DIR):
+    """
+    Remove entries computed from previous contents of the data file.
+
+    Parameters
+    ----------
+    data_path : str
+        path to data file.
+    cache_dir : str
+        cache directory.
+
+    Returns
+    -------
+    int
+        number of removed entries.
+
+    """
+
+    tag = _path_tag(data_path)
+    current = fingerprint(data_path)[:16]
+    removed = 0
+    for e in _entries(cache_dir):
+        parts = os.path.basename(e).split('_')
+        if parts[0] == tag and parts[1] != current:
+            # another process may have removed it already
+            try:
+                os.remove(e)
+            except FileNotFoundError:
+                continue
+            removed += 1
+    return removed
+
+
+def evict(cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+    """
+    Remove least recently used entries until at most max_entries are left.
+
+    Parameters
+    ----------
+    cache_dir : str
+        cache directory.
+    max_entries : int
+        maximum number of entries in the cache.
+
+    """
+
+    entries = []
+    for e in _entries(cache_dir):
+        try:
+            entries.append((os.path.getmtime(e), e))
+        except FileNotFoundError:
+            pass
+    entries.sort()
+    for _, e in entries[:max(len(entries)-max_entries, 0)]:
+        try:
+            os.remove(e)
+        except FileNotFoundError:
+            pass
+
+
+def load(data_path, params, cache_dir=CACHE_DIR):
+    """
+    Get ideal vector, nadir vector and payoff table from the cache.
+
+    Parameters
+    ----------
+    data_path : str
+        path to data file the payoff table was calculated from.
+    params : dict
+        solve parameters, e.g. number of companies and tolerance for beta.
+    cache_dir : str
+        cache directory.
+
+    Returns
+    -------
+    tuple or None
+        ideal vector, nadir vector and payoff table, None if not cached.
+
+    """
+
+    invalidate(data_path, cache_dir)
+    entry = _entry(data_path, params, cache_dir)
+
+    # the entry may be removed by another process at any time
+    try:
+        with np.load(entry) as cached:
+            z_ideal = list(cached['ideal'])
+            z_nadir = list(cached['nadir'])
+            solutions = list(cached['solutions'])
+        # mark as recently used
+        os.utime(entry)
+    except FileNotFoundError:
+        return None
+    return z_ideal, z_nadir, solutions
+
+
+def store(data_path, params, z_ideal, z_nadir, solutions,
+          cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+    """
+    Store ideal vector, nadir vector and payoff table in the cache.
+
+    Parameters
+    ----------
+    data_path : str
+        path to data file the payoff table was calculated from.
+    params : dict
+        solve parameters, e.g. number of companies and tolerance for beta.
+    z_ideal : list
+        ideal vector.
+    z_nadir : list
+        nadir vector.
+    solutions : list
+        payoff table.
+    cache_dir : str
+        cache directory.
+    max_entries : int
+        maximum number of entries in the cache.
+
+    """
+
+    os.makedirs(cache_dir, exist_ok=True)
+    invalidate(data_path, cache_dir)
+    entry = _entry(data_path, params, cache_dir)
+
+    # write to a temporary file of this process first, so that readers never
+    # see a partial entry and concurrent stores do not replace each other's file
+    tmp = entry + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp, 'wb') as file:
+        np.savez(file, ideal=np.asarray(z_ideal, dtype=float),
+                 nadir=np.asarray(z_nadir, dtype=float),
+                 solutions=np.asarray(solutions, dtype=float))
+    os.replace(tmp, entry)
+    evict(cache_dir, max_entries)
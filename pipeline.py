@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import os
+import pandas as pd
+import market_data_calculation
+import organizing_data
+from payoff_cache import fingerprint
+import web_scraper
+
+"""
+Runner for the data pipeline, from scraping to final_data.csv.
+
+Each stage declares its input and output files. Inputs (including the scripts
+of the stages, so that e.g. a tweak to risk free rates in
+market_data_calculation.py counts as a change) are fingerprinted by content, and
+a stage is run only if its inputs have changed since its last successful run, or
+its outputs are missing or have been changed. Stages depend on the stages whose
+outputs they read; independent stages are run concurrently. A stage whose
+outputs do not change when rerun does not trigger the stages after it.
+
+The ranking page of the scrape stage is downloaded, and can not be
+fingerprinted: rerun it with --force scrape to refresh it.
+
+Usage:
+    python pipeline.py
+    python pipeline.py --dry-run
+    python pipeline.py --force markets
+
+"""
+
+STATE_PATH = 'data/cache/pipeline.json'
+# ESG scores of the ranking are percentiles from 0 to 100, the optimization 
+# methods use them on a scale from 0 to 1
+ESG_SCALE = 100
+
+# a stage of the pipeline: function running it, and input and output files
+Stage = namedtuple('Stage', ['name', 'run', 'inputs', 'outputs'])
+
+
+def build_final_data(source='data/data_combined.csv', output='data/final_data.csv'):
+    """
+    Write the dataset the optimization methods are solved for.
+
+    Companies with missing fundamentals or expected return are left out, and 
+    ESG scores are scaled from percentiles to 0-1, see ESG_SCALE.
+
+    Parameters
+    ----------
+    source : str
+        company data with fundamentals and expected returns, see
+        market_data_calculation.refresh_company_data.
+    output : str
+        path to output file.
+
+    """
+
+    data = pd.read_csv(source,index_col=0)
+    columns = market_data_calculation.COLUMNS + ['Expected return']
+    required = list(market_data_calculation.FUNDAMENTALS) + ['Expected return']
+    data = data.dropna(axis=0,how='any',subset=required)[columns]
+    data['ESG score'] = data['ESG score']/ESG_SCALE
+    data.reset_index(drop=True).to_csv(output)
+
+
+def _markets():
+    market_data_calculation.calculate_market_data()
+
+
+def _fundamentals():
+    market_data_calculation.refresh_company_data(incremental=True)
+
+
+STAGES = [
+    Stage('scrape', web_scraper.main,
+          ['web_scraper.py', web_scraper.LISTING_PAGE,
+           'data/clean200.xlsx', 'data/sciencebasedtargets.xlsx'],
+          ['data/robecosam.csv', 'data/symbols_nasdaq_nordic.csv',
+           'data/clean200.csv', 'data/sciencebasedtargets.csv']),
+    Stage('organize', organizing_data.main,
+          ['organizing_data.py', 'data/robecosam.csv', 'data/clean200.csv',
+           'data/sciencebasedtargets.csv', 'data/symbols_nasdaq.csv',
+           'data/symbols_nyse.csv', 'data/symbols_nasdaq_nordic.csv'],
+          ['data/combined_data.csv']),
+    Stage('markets', _markets,
+          ['market_data_calculation.py'] + list(market_data_calculation.INDICES.values()),
+          ['data/market_data.csv']),
+    Stage('fundamentals', _fundamentals,
+          ['market_data_calculation.py', 'data/combined_data.csv', 'data/market_data.csv'],
+          ['data/data_combined.csv']),
+    Stage('final', build_final_data,
+          ['pipeline.py', 'data/data_combined.csv'],
+          ['data/final_data.csv']),
+    ]
+
+
+def read_state(path=STATE_PATH):
+    """
+    Fingerprints of inputs and outputs of each stage at its last successful run.
+    """
+
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(state, path=STATE_PATH):
+    """
+    Write fingerprints of stages, see read_state.
+    """
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=1)
+    os.replace(tmp, path)
+
+
+def fingerprints(paths):
+    """
+    Content hashes of files, None for missing files.
+    """
+
+    return {p: fingerprint(p) if os.path.exists(p) else None for p in paths}
+
+
+def is_fresh(stage, state):
+    """
+    Check whether outputs of a stage are up to date.
+
+    Parameters
+    ----------
+    stage : Stage
+        stage of the pipeline.
+    state : dict
+        fingerprints of stages, see read_state.
+
+    Returns
+    -------
+    bool
+        True if inputs and outputs are the same as after the last successful run.
+
+    """
+
+    entry = state.get(stage.name)
+    if entry is None:
+        return False
+    return (entry['inputs'] == fingerprints(stage.inputs)
+            and entry['outputs'] == fingerprints(stage.outputs)
+            and all(entry['outputs'].values()))
+
+
+def dependencies(stages):
+    """
+    Stages each stage depends on, i.e. stages producing its inputs.
+
+    Parameters
+    ----------
+    stages : list
+        stages of the pipeline.
+
+    Returns
+    -------
+    dict
+        names of stages each stage depends on, keyed by name of stage.
+
+    """
+
+    return {s.name: {t.name for t in stages if t is not s and set(t.outputs) & set(s.inputs)}
+            for s in stages}
+
+
+def run(stages=STAGES, force=(), workers=4, state_path=STATE_PATH, dry_run=False):
+    """
+    Run the stages of the pipeline whose inputs have changed.
+
+    Parameters
+    ----------
+    stages : list
+        stages of the pipeline.
+    force : list
+        names of stages run even if their inputs have not changed.
+    workers : int
+        maximum number of stages run concurrently.
+    state_path : str
+        path to fingerprints of stages.
+    dry_run : bool
+        only report which stages would be run. Stages after a stage that
+        would be run are reported as stale.
+
+    Returns
+    -------
+    dict
+        status of each stage: 'fresh', 'ran', 'stale' (dry run), 'failed', or
+        'skipped' if a stage it depends on failed.
+
+    """
+
+    state = read_state(state_path)
+    deps = dependencies(stages)
+    status = {}
+    pending = list(stages)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            ready = [s for s in pending if deps[s.name] <= set(status)]
+            if not ready and not running:
+                raise ValueError("Stages depend on each other: "
+                                 + ', '.join(s.name for s in pending))
+            for s in ready:
+                pending.remove(s)
+                upstream = [status[d] for d in deps[s.name]]
+                if any(u in ('failed', 'skipped') for u in upstream):
+                    status[s.name] = 'skipped'
+                elif dry_run:
+                    stale = (s.name in force or 'stale' in upstream
+                             or not is_fresh(s, state))
+                    status[s.name] = 'stale' if stale else 'fresh'
+                elif s.name not in force and is_fresh(s, state):
+                    status[s.name] = 'fresh'
+                else:
+                    print("Running stage " + s.name)
+                    running[pool.submit(s.run)] = (s, fingerprints(s.inputs))
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done:
+                s, inputs = running.pop(f)
+                try:
+                    f.result()
+                except Exception as e:
+                    print("Stage " + s.name + " failed: " + repr(e))
+                    status[s.name] = 'failed'
+                    continue
+                status[s.name] = 'ran'
+                state[s.name] = {'inputs': inputs, 'outputs': fingerprints(s.outputs)}
+                write_state(state, state_path)
+
+    for s in stages:
+        print(s.name + ": " + status[s.name])
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run the stages of the data pipeline whose inputs have changed.')
+    parser.add_argument('--force', nargs='+', default=[], metavar='STAGE',
+                        choices=[s.name for s in STAGES],
+                        help='stages run even if their inputs have not changed')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='maximum number of stages run concurrently')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report which stages would be run')
+    args = parser.parse_args()
+
+    status = run(force=args.force, workers=args.workers, dry_run=args.dry_run)
+    if 'failed' in status.values():
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
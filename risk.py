@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import market_data_calculation
+
+"""
+Factor model of portfolio risk.
+
+Returns of companies are modeled with one factor per market, the return of the
+market's index, so that covariance of returns is
+
+    B F B^T + diag(D),
+
+where B (n x k) has the loading of each company on the factors, F (k x k) is
+covariance of the factors, estimated from index histories in data/, and D has
+idiosyncratic variances of companies. The loading of a company is its beta on
+the index of its home market (see market_data_calculation.company_markets).
+Variance of a portfolio and its gradient are evaluated through the k factor
+exposures B^T x, in O(n*k) time, without forming the n x n covariance matrix.
+
+Example:
+    model = risk_model(data)
+    variance(x, model), variance_jac(x, model)
+
+"""
+
+# idiosyncratic variance of returns of a company, annual
+IDIOSYNCRATIC_VARIANCE = 0.04
+
+# loadings (n x k), factor covariance (k x k) and idiosyncratic variances (n)
+RiskModel = namedtuple('RiskModel', ['loadings', 'factor_cov', 'idiosyncratic'])
+
+
+def factor_covariance(indices=market_data_calculation.INDICES, periods=None):
+    """
+    Annualized covariance of returns of market indices.
+
+    Returns of each period are calculated from open to adjusted close, over the
+    dates included in all index histories.
+
+    Parameters
+    ----------
+    indices : dict
+        paths to price histories of indices, keyed by name of market.
+    periods : int, optional
+        number of periods per year, by default inferred from dates.
+
+    Returns
+    -------
+    np.array
+        k x k covariance matrix, in order of indices.
+
+    """
+
+    changes = []
+    for path in indices.values():
+        m = pd.read_csv(path).dropna(axis=0,how='any')
+        change = (m['Adj Close']-m['Open'])/m['Open']
+        changes.append(pd.Series(change.values, index=m['Date']))
+    changes = pd.concat(changes, axis=1, join='inner').sort_index()
+    if periods is None:
+        periods = market_data_calculation.periods_per_year(changes.index.to_series())
+    return np.cov(changes.to_numpy(dtype=float), rowvar=False)*periods
+
+
+def risk_model(data, idiosyncratic=IDIOSYNCRATIC_VARIANCE, factor_cov=None,
+               indices=market_data_calculation.INDICES):
+    """
+    Build factor model of risk for companies.
+
+    Parameters
+    ----------
+    data : DataFrame or dataset.Dataset
+        data for companies, in the format of final_data.csv.
+    idiosyncratic : float or np.array
+        idiosyncratic variance, for all companies or for each company.
+    factor_cov : np.array, optional
+        covariance of factors, by default estimated with factor_covariance.
+    indices : dict
+        paths to price histories of indices, keyed by name of market.
+
+    Returns
+    -------
+    RiskModel
+        loadings, factor covariance and idiosyncratic variances.
+
+    """
+
+    if factor_cov is None:
+        factor_cov = factor_covariance(indices)
+    markets = market_data_calculation.company_markets(data)
+    betas = np.asarray(data['Beta'], dtype=float)
+    n = len(betas)
+
+    # companies without any listing are not exposed to the factors
+    loadings = np.zeros((n, len(factor_cov)))
+    listed = np.flatnonzero(markets >= 0)
+    loadings[listed, markets[listed]] = betas[listed]
+    idiosyncratic = np.broadcast_to(np.asarray(idiosyncratic, dtype=float), n).copy()
+    return RiskModel(loadings, np.asarray(factor_cov, dtype=float), idiosyncratic)
+
+
+def inputs_fingerprint(indices=market_data_calculation.INDICES,
+                       idiosyncratic=IDIOSYNCRATIC_VARIANCE):
+    """
+    Fingerprint of the inputs of a risk model besides company data.
+
+    Parameters
+    ----------
+    indices : dict
+        paths to price histories of indices, keyed by name of market.
+    idiosyncratic : float or np.array
+        idiosyncratic variance, for all companies or for each company.
+
+    Returns
+    -------
+    dict
+        hashes of contents of index histories, keyed by name of market, and
+        idiosyncratic variance, as json-serializable values.
+
+    """
+
+    from payoff_cache import fingerprint
+    return {'indices': {m: fingerprint(path) for m, path in indices.items()},
+            'idiosyncratic': np.asarray(idiosyncratic, dtype=float).tolist()}
+
+
+def subset(model, n):
+    """
+    Risk model of the first n companies.
+    """
+
+    return RiskModel(model.loadings[:n], model.factor_cov, model.idiosyncratic[:n])
+
+
+def variance(x, model):
+    """
+    Variance of portfolio.
+
+    Parameters
+    ----------
+    x : np.array
+        weights of companies.
+    model : RiskModel
+        risk model of the companies.
+
+    Returns
+    -------
+    float
+        variance of returns of the portfolio.
+
+    """
+
+    x = np.asarray(x, dtype=float)
+    exposures = x @ model.loadings
+    return exposures @ model.factor_cov @ exposures + model.idiosyncratic @ (x*x)
+
+
+def variance_jac(x, model):
+    """
+    Gradient of variance of portfolio.
+
+    Parameters
+    ----------
+    x : np.array
+        weights of companies.
+    model : RiskModel
+        risk model of the companies.
+
+    Returns
+    -------
+    np.array
+        partial derivatives with respect to weights.
+
+    """
+
+    x = np.asarray(x, dtype=float)
+    exposures = x @ model.loadings
+    return 2*(model.loadings @ (model.factor_cov @ exposures)) + 2*model.idiosyncratic*x
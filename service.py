@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, wait
+import contextlib
+import io
+import json
+import math
+import os
+import numpy as np
+import dataset
+import solver
+
+"""
+Local optimization service.
+
+An HTTP server, built on asyncio, answering epsilon constraint and reference
+point queries with the sessions of solver.py. Each worker process of the pool
+loads the data and builds the model once, at start-up, and solves every query
+it gets with them, so a query costs only the solve. Queries wait in a queue of
+limited size for a free worker; when the queue is full, the server answers
+503 with Retry-After at once instead of letting queries pile up.
+
+Endpoints (JSON):
+    GET  /health             status, size of queue and number of workers
+    GET  /ideal              ideal and nadir vectors, and names of objectives
+    POST /e-constraint       {"objective": 4, "bounds": [0.09, 0.6, 2, 1]}
+    POST /reference-point    {"reference": [0.1, 0.5, 3, 1, 15]}
+
+Objective is an index of objective (0 expected return ... 4 p/e ratio), and
+bounds are given for the other four objectives, in order of objectives. Both
+queries answer with weights of companies invested in, objective values and
+beta of the portfolio.
+
+Usage:
+    python service.py --port 8000 --workers 4 --queue-size 64
+
+"""
+
+PORT = 8000
+QUEUE_SIZE = 64
+# seconds a client is told to wait before retrying, when the queue is full
+RETRY_AFTER = 1
+# companies with smaller weights are left out of answers
+MIN_WEIGHT = 1e-6
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+MAX_BODY = 1 << 16
+
+# sessions of a worker process, see _init_worker
+_sessions = {}
+
+
+def _init_worker(b_tol, screen, payoff):
+    """
+    Load data and build the models of both methods in a worker process.
+
+    Ideal and nadir vectors are calculated once, by start_pool, so that
+    workers neither repeat the calculation nor write the disk cache.
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = dataset.load(solver.DATA_PATH)
+        _sessions['e-constraint'] = solver.EConstraintSession(data, b_tol, screen=screen)
+        _sessions['reference-point'] = solver.RefPointSession(data, b_tol, use_cache=False,
+                                                              payoff=payoff)
+
+
+def _info():
+    """
+    Description of the sessions of a worker process.
+    """
+
+    ref = _sessions['reference-point']
+    return {'pid': os.getpid(),
+            'companies': len(_sessions['e-constraint'].names),
+            'backend': _sessions['e-constraint'].backend,
+            'objectives': list(solver.rpm.objectives),
+            'ideal': [float(z) for z in ref.z_ideal],
+            'nadir': [float(z) for z in ref.z_nadir]}
+
+
+def _answer(session, x):
+    """
+    Portfolio x, over the companies of session, in the form of an answer.
+    """
+
+    invested = np.flatnonzero(x > MIN_WEIGHT)
+    return {'feasible': True,
+            'weights': {str(session.names[j]): float(x[j]) for j in invested},
+            'objectives': (x @ session.values).tolist(),
+            'beta': float(session.betas @ x)}
+
+
+def solve(kind, query):
+    """
+    Solve a query in a worker process.
+
+    Parameters
+    ----------
+    kind : str
+        'e-constraint' or 'reference-point'.
+    query : dict
+        query, validated with parse_query.
+
+    Returns
+    -------
+    dict
+        answer to the query.
+
+    """
+
+    session = _sessions[kind]
+    # solve_problem of e-constraint method prints each solution
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == 'e-constraint':
+            x = session.solve(query['objective'], query['bounds'])
+        else:
+            res = session.solve(query['reference'])
+            x = res.x if res.success or session.asf_method == 'slsqp' else None
+    if x is None:
+        return {'feasible': False}
+    return _answer(session, np.asarray(x))
+
+
+def _numbers(query, key, n):
+    """
+    List of n finite numbers from a query.
+    """
+
+    values = query.get(key)
+    if (not isinstance(values, list) or len(values) != n
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                       and math.isfinite(v) for v in values)):
+        raise ValueError(key + " must be a list of " + str(n) + " numbers")
+    return [float(v) for v in values]
+
+
+def parse_query(kind, body):
+    """
+    Parse and validate the body of a query.
+
+    Parameters
+    ----------
+    kind : str
+        'e-constraint' or 'reference-point'.
+    body : bytes
+        JSON body of the request.
+
+    Returns
+    -------
+    dict
+        query with objective and bounds, or reference point.
+
+    """
+
+    try:
+        query = json.loads(body or b'{}')
+    except ValueError:
+        raise ValueError("Body is not valid JSON")
+    if not isinstance(query, dict):
+        raise ValueError("Body must be a JSON object")
+    if kind == 'e-constraint':
+        objective = query.get('objective')
+        if not isinstance(objective, int) or isinstance(objective, bool) \
+                or not 0 <= objective < len(solver.rpm.objectives):
+            raise ValueError("objective must be an index of objective, from 0 to "
+                             + str(len(solver.rpm.objectives)-1))
+        return {'objective': objective,
+                'bounds': _numbers(query, 'bounds', len(solver.rpm.objectives)-1)}
+    return {'reference': _numbers(query, 'reference', len(solver.rpm.objectives))}
+
+
+class Service:
+    """
+    Queue of queries and the worker pool solving them.
+
+    Parameters
+    ----------
+    pool : concurrent.futures.ProcessPoolExecutor
+        worker pool, see start_pool.
+    workers : int
+        number of worker processes.
+    queue_size : int
+        maximum number of queries waiting for a worker.
+    info : dict
+        description of the sessions of workers.
+
+    """
+
+    def __init__(self, pool, workers, queue_size, info):
+        self.pool = pool
+        self.workers = workers
+        self.info = info
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.tasks = []
+
+    def start(self):
+        """
+        Start dispatching queries to workers, one dispatcher per worker.
+        """
+
+        self.tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            kind, query, answer = await self.queue.get()
+            try:
+                # the client may have disconnected while waiting
+                if not answer.done():
+                    result = await loop.run_in_executor(self.pool, solve, kind, query)
+                    if not answer.done():
+                        answer.set_result(result)
+            except Exception as e:
+                if not answer.done():
+                    answer.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, kind, query):
+        """
+        Queue a query and wait for its answer.
+
+        Raises
+        ------
+        asyncio.QueueFull
+            if the queue is full.
+
+        """
+
+        answer = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((kind, query, answer))
+        return await answer
+
+    async def respond(self, method, path, body):
+        """
+        Answer a request.
+
+        Returns
+        -------
+        status : int
+            HTTP status code.
+        answer : dict
+            body of response.
+        headers : dict
+            additional headers.
+
+        """
+
+        if path == '/health':
+            return 200, {'status': 'ok', 'workers': self.workers,
+                         'queued': self.queue.qsize(),
+                         'queue_size': self.queue.maxsize}, {}
+        if path == '/ideal':
+            return 200, {k: self.info[k] for k in ('objectives', 'ideal', 'nadir')}, {}
+        kind = path.strip('/')
+        if kind not in ('e-constraint', 'reference-point'):
+            return 404, {'error': 'Unknown path ' + path}, {}
+        if method != 'POST':
+            return 405, {'error': 'Use POST for ' + path}, {'Allow': 'POST'}
+        try:
+            query = parse_query(kind, body)
+        except ValueError as e:
+            return 400, {'error': str(e)}, {}
+        try:
+            return 200, await self.submit(kind, query), {}
+        except asyncio.QueueFull:
+            return 503, {'error': 'Queue is full, retry later'}, \
+                {'Retry-After': str(RETRY_AFTER)}
+        except Exception as e:
+            # errors of solving are not errors of the query
+            print("Solving " + kind + " query failed: " + repr(e))
+            return 500, {'error': 'Solving the query failed'}, {}
+
+    async def handle(self, reader, writer):
+        """
+        Serve requests of a connection, keeping it open between requests.
+        """
+
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    status, answer, extra = 413, {'error': 'Body is too large'}, {}
+                else:
+                    try:
+                        status, answer, extra = await self.respond(method, path, body)
+                    except Exception as e:
+                        status, answer, extra = 500, {'error': repr(e)}, {}
+                close = headers.get('connection', '').lower() == 'close' or body is None
+                writer.write(response(status, answer, extra, close))
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader):
+    """
+    Read an HTTP request.
+
+    Returns
+    -------
+    tuple or None
+        method, path, headers (lower case names) and body, None if the
+        connection was closed. Body is None if it is larger than MAX_BODY.
+
+    """
+
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        return method, target.split('?')[0], headers, None
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?')[0], headers, body
+
+
+def response(status, answer, headers=None, close=False):
+    """
+    HTTP response with a JSON body.
+    """
+
+    body = json.dumps(answer).encode('utf-8')
+    lines = ['HTTP/1.1 ' + str(status) + ' ' + REASONS[status],
+             'Content-Type: application/json',
+             'Content-Length: ' + str(len(body)),
+             'Connection: ' + ('close' if close else 'keep-alive')]
+    lines += [k + ': ' + v for k, v in (headers or {}).items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+def start_pool(workers, b_tol=solver.B_TOL, screen=False):
+    """
+    Start worker processes, each loading data and building models.
+
+    Ideal and nadir vectors are calculated, or read from the disk cache, in
+    this process and passed to workers. Workers are started before the event
+    loop, and the call returns when all of them are ready.
+
+    Parameters
+    ----------
+    workers : int
+        number of worker processes.
+    b_tol : float
+        tolerance for beta constraint.
+    screen : bool
+        leave out companies which can not change the optimal values of
+        objectives in the e-constraint method, see solver.EConstraintSession.
+
+    Returns
+    -------
+    pool : concurrent.futures.ProcessPoolExecutor
+        worker pool.
+    info : dict
+        description of the sessions of a worker.
+
+    Raises
+    ------
+    RuntimeError
+        if a worker fails to start.
+
+    """
+
+    ref = solver.RefPointSession(b_tol=b_tol, path=solver.DATA_PATH)
+    payoff = (ref.z_ideal, ref.z_nadir, ref.solutions)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(b_tol, screen, payoff))
+    # a process is started for each task submitted while none are idle
+    ready = [pool.submit(_info) for _ in range(workers)]
+    wait(ready)
+    errors = [f.exception() for f in ready if f.exception() is not None]
+    if errors:
+        pool.shutdown(cancel_futures=True)
+        raise RuntimeError("Worker failed to start: " + repr(errors[0])) from errors[0]
+    return pool, ready[0].result()
+
+
+async def serve(pool, workers, info, host='127.0.0.1', port=PORT, queue_size=QUEUE_SIZE):
+    """
+    Serve queries until cancelled.
+
+    Parameters
+    ----------
+    pool : concurrent.futures.ProcessPoolExecutor
+        worker pool from start_pool.
+    workers : int
+        number of worker processes.
+    info : dict
+        description of the sessions of workers, from start_pool.
+    host : str
+        address to listen.
+    port : int
+        port to listen.
+    queue_size : int
+        maximum number of queries waiting for a worker.
+
+    """
+
+    service = Service(pool, workers, queue_size, info)
+    service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print("Serving " + str(info['companies']) + " companies on http://" + host + ":"
+          + str(port) + " with " + str(workers) + " workers (" + info['backend'] + ")")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve epsilon constraint and reference point queries over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='maximum number of queries waiting for a worker')
+    parser.add_argument('--b-tol', type=float, default=solver.B_TOL,
+                        help='tolerance for beta constraint')
+    parser.add_argument('--screen', action='store_true',
+                        help='leave out companies which can not change optimal values '
+                             '(e-constraint method)')
+    args = parser.parse_args()
+
+    pool, info = start_pool(args.workers, args.b_tol, args.screen)
+    try:
+        asyncio.run(serve(pool, args.workers, info, args.host, args.port, args.queue_size))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,24 +4,37 @@ Created on Sat May 23 14:09:46 2020
 
 @author: Antti Luopajärvi
 
-Interactive multiobjective portfolio optimization. 
+Interactive multiobjective portfolio optimization.
 
-User can choose from two methods, 
+User can choose from two methods,
     1) Epsilon-constraint method
-    2) Reference point method (not yet implemented)
-, and solve multiobjective portfolio optimization problem interactively. 
+    2) Reference point method
+, and solve multiobjective portfolio optimization problem interactively.
 
-User can provide their preferences and desired levels for multiple objectives 
+User can provide their preferences and desired levels for multiple objectives
  ==> 1) Expected return
      2) Sustainability
      3) Dividend yield
      4) Clean energy use
      5) Price-to-earnings-ratio.
 
+After each solution, user can adjust a single bound or reference level and the
+problem is solved again. Data, the built model, ideal and nadir vectors and the
+last solution are kept in memory for the whole session, so that only the
+problem with the new level is solved: from the previous basis when a persistent
+solver is installed (see optimization_e_constraint_method.select_backend), and
+from the previous solution with slsqp.
+
 """
 
-from optimization_e_constraint_method import params, solve_problem
-import pandas as pd
+import time
+import numpy as np
+import dataset
+import optimization_e_constraint_method as ecm
+import optimization_ref_point_method as rpm
+
+DATA_PATH = 'data/final_data.csv'
+B_TOL = 0.1
 
 
 def init_data(obj_i):
@@ -35,7 +48,7 @@ def init_data(obj_i):
 
     Returns
     -------
-    data : DataFrame
+    data : dataset.Dataset
         data for companies.
     constraints : list
         names of objectives set to constraints, according to e-constraint method.
@@ -43,76 +56,296 @@ def init_data(obj_i):
         name of objective to be optimized.
 
     """
-    data = pd.read_csv('data/final_data.csv')
-    objectives = ['Expected return',
-         'Sustainability',
-         'Dividend yield',
-         'Clean energy use',
-         'P/E ratio']
+    data = dataset.load(DATA_PATH)
+    objectives = list(rpm.objectives)
     objective = objectives[obj_i]
     # drop the objective off
     objectives.remove(objective)
     constraints = objectives
-    
+
     return data, constraints, objective
 
 
-def init_problem():
+class EConstraintSession:
     """
-    Initialize multiobjective optimization problem for solving.
+    Epsilon constraint method solved repeatedly for the same data.
+
+    The model is built once, when the session is started, and each solve only
+    changes the objective and bounds of the model.
+
+    Parameters
+    ----------
+    data : DataFrame or dataset.Dataset
+        data for companies, in the format of final_data.csv.
+    b_tol : float
+        tolerance for beta constraint.
+    backend : str
+        solver backend, see optimization_e_constraint_method.solve_backend. By
+        default a solver keeping the model between solves is preferred.
+    screen : bool
+        leave out companies which can not change the optimal values of
+        objectives before building the model, see pareto.screen.
+
+    Attributes
+    ----------
+    names : np.array
+        names of companies of the model, only those kept if screened.
+    values, betas : np.array
+        objective values (n x 5) and betas of companies of the model.
+    x : np.array or None
+        weights of companies of the last solution, None before the first
+        solution or if the last problem was infeasible.
+
+    """
+
+    def __init__(self, data, b_tol=B_TOL, backend='auto', screen=False):
+        self.names, self.params = ecm.params(data, screen)
+        self.values = np.column_stack(self.params[2:]).astype(float)
+        self.betas = np.asarray(self.params[1], dtype=float)
+        self.b_tol = b_tol
+        if backend == 'auto':
+            backend = ecm.select_backend(len(self.names), warm_start=True)
+        self.backend = backend
+        self.model = ecm.build_problem(self.params, b_tol, backend)
+        self.x = None
+
+    def solve(self, obj_i, constraints, stats=None):
+        """
+        Solve the problem for given objective and bounds.
+
+        Parameters
+        ----------
+        obj_i : int
+            index of objective to be optimized.
+        constraints : list
+            lower/upper bounds for the other four objectives.
+        stats : instrumentation.Stats, optional
+            collects timers of phase 'solve', and solver iteration counts.
+
+        Returns
+        -------
+        np.array or None
+            weights of companies, None if the problem is infeasible.
+
+        """
+
+        self.x, _ = ecm.solve_problem(self.params, self.names, obj_i, constraints,
+                                      self.b_tol, model=self.model,
+                                      backend=self.backend, stats=stats)
+        return self.x
+
+
+class RefPointSession:
+    """
+    Reference point method solved repeatedly for the same data.
+
+    Ideal and nadir vectors are calculated once, when the session is started.
+    Each solve only minimizes the achievement scalarizing function for a new
+    reference point. With method 'slsqp', it is started from the last solution.
+
+    Parameters
+    ----------
+    data : DataFrame or dataset.Dataset, optional
+        data for companies, by default loaded from path.
+    b_tol : float
+        tolerance for beta constraint.
+    ideal_method : str
+        method for calculating ideal vector, 'slsqp' or 'lp'.
+    asf_method : str
+        method for solving achievement scalarizing function, 'slsqp' or 'lp'.
+    rho : float
+        augmentation parameter of achievement scalarizing function.
+    use_cache : bool
+        read and store ideal and nadir vectors in disk cache, see payoff_cache.
+    path : str, optional
+        file the data was read from, identifying the data in the disk cache of
+        ideal and nadir vectors. Data is loaded from it if not given, by
+        default from DATA_PATH. Ideal and nadir vectors of data given without
+        a path are not cached.
+    payoff : tuple, optional
+        ideal vector, nadir vector and payoff table, as returned by
+        optimization_ref_point_method.ideal_and_nadir, e.g. from another
+        session for the same data. Calculated if not given.
+
+    Attributes
+    ----------
+    names : np.array
+        names of companies.
+    values, betas : np.array
+        objective values (n x 5) and betas of companies.
+    z_ideal, z_nadir : list
+        ideal and nadir vectors.
+    x : np.array
+        weights of companies of the last solution, equal weights before the
+        first solution.
+
+    """
+
+    def __init__(self, data=None, b_tol=B_TOL, ideal_method='lp', asf_method='lp',
+                 rho=0.000001, use_cache=True, path=None, payoff=None):
+        if data is None:
+            rpm.load_data(path or DATA_PATH)
+        else:
+            rpm.set_data(data, path)
+        self.names = np.asarray(rpm.data['Company'])
+        self.values, self.betas = rpm.problem_data()
+        self.b_tol = b_tol
+        self.asf_method = asf_method
+        self.rho = rho
+        n = len(self.names)
+        self.x = np.full(n, 1/n)
+        if payoff is None:
+            payoff = rpm.ideal_and_nadir(rpm.f, list(self.x), b_tol, ideal_method,
+                                         use_cache=use_cache)
+        self.z_ideal, self.z_nadir, self.solutions = payoff
+
+    def solve(self, ref, stats=None):
+        """
+        Solve the problem for given reference point.
+
+        Parameters
+        ----------
+        ref : list
+            reference point, desired levels of the five objectives.
+        stats : instrumentation.Stats, optional
+            collects evaluation and iteration counts.
+
+        Returns
+        -------
+        scipy.optimize.optimize.OptimizeResult
+            result of optimization.
+
+        """
+
+        res = rpm.asf(rpm.f_normalized, ref, self.b_tol, self.x, self.z_ideal,
+                      self.z_nadir, self.rho, method=self.asf_method, disp=False,
+                      stats=stats)
+        if res.success or self.asf_method == 'slsqp':
+            self.x = res.x
+        return res
+
+
+def print_portfolio(names, x, values, betas):
+    """
+    Print companies invested in, and objective values and beta of the portfolio.
+    """
+
+    print("\nCompanies to invest in:")
+    for j in np.flatnonzero(x > 1e-6):
+        print(names[j] + " : " + str(round(x[j],4)))
+    print("\nObjective function values:")
+    for name, value in zip(rpm.objectives, values):
+        print(name + " : " + str(value))
+    print("Portfolio beta : " + str(betas @ x))
+
+
+def read_levels(names, kind):
+    """
+    Ask levels for given objectives.
+    """
+
+    return [float(input(kind + " for " + n + ": ")) for n in names]
+
+
+def adjust(levels, names, kind):
+    """
+    Ask user to adjust one of the levels.
+
+    Parameters
+    ----------
+    levels : list
+        current bounds or reference levels.
+    names : list
+        names of objectives of levels.
+    kind : str
+        'Bound' or 'Reference level'.
 
     Returns
     -------
-    data : DataFrame
-        data for companies.
-    constraints : list
-        names of constraint functions.
-    obj_opt : str
-        name of objective function.
-    obj_i : int
-        index of objective to be optimized.
-    c : list
-        bounds for constraint functions.
+    list or None
+        adjusted levels, None if user quits.
 
     """
-    
-    nb = int(input('Select your optimization method : \nEpsilon constraint method, press 1\
-          \nReference point method, press 2 (not yet available)\n> '))
-    if nb == 1:
-        obj = int(input("Select an objective to be optimized:\n\
+
+    print("\nAdjust a level:")
+    for i, (n, l) in enumerate(zip(names, levels)):
+        print("  " + n + " (" + str(l) + "), press " + str(i+1))
+    while True:
+        answer = input("Number of the level, 'a' for all levels, 'q' to quit\n> ").strip()
+        if answer == 'q':
+            return None
+        if answer == 'a':
+            return read_levels(names, kind)
+        try:
+            i = int(answer)-1
+            if not 0 <= i < len(levels):
+                raise ValueError
+            value = float(input(kind + " for " + names[i] + ": "))
+        except ValueError:
+            print("Invalid input")
+            continue
+        levels = list(levels)
+        levels[i] = value
+        return levels
+
+
+def e_constraint_session():
+    """
+    Solve the problem interactively with epsilon constraint method.
+    """
+
+    obj = int(input("Select an objective to be optimized:\n\
                     Expected return, press 1\n\
                     Sustainability, press 2\n\
                     Dividend yield, press 3\n\
                     Clean energy use, press 4\n\
                     P/E ratio, press 5\n>"))
-        obj_i = obj-1
-        data, constraints, obj_opt = init_data(obj_i)
-        
-        # constraints
-        print("Set bounds for other objectives.")
-        c1 = float(input("Bound for "+ constraints[0]+ ": "))
-        c2 = float(input("Bound for "+ constraints[1]+ ": "))
-        c3 = float(input("Bound for "+ constraints[2]+ ": "))
-        c4 = float(input("Bound for "+ constraints[3]+ ": "))
-        c = [c1,c2,c3,c4]
-        
-        return data,constraints,obj_opt,obj_i,c
-            
-    else: 
-        # TO DO: Reference point method 
-        print("Reference point method yet not supported.")
-                
+    obj_i = obj-1
+    data, constraints, obj_opt = init_data(obj_i)
+    session = EConstraintSession(data)
+
+    # constraints
+    print("Set bounds for other objectives.")
+    c = read_levels(constraints, "Bound")
+    while c is not None:
+        start = time.perf_counter()
+        session.solve(obj_i, c)
+        print("\nSolved in " + str(round(time.perf_counter()-start,3)) + " s")
+        c = adjust(c, constraints, "Bound")
+
+
+def ref_point_session():
+    """
+    Solve the problem interactively with reference point method.
+    """
+
+    print("Calculating ideal and nadir vectors...")
+    session = RefPointSession(path=DATA_PATH)
+    print("\nIdeal vector: " + str(np.round(session.z_ideal,4)))
+    print("Nadir vector: " + str(np.round(session.z_nadir,4)))
+
+    print("\nSet reference levels for objectives.")
+    ref = read_levels(rpm.objectives, "Reference level")
+    while ref is not None:
+        start = time.perf_counter()
+        res = session.solve(ref)
+        elapsed = time.perf_counter()-start
+        if res.success or session.asf_method == 'slsqp':
+            print_portfolio(session.names, res.x, res.x @ session.values, session.betas)
+        else:
+            print("No solution found: " + str(res.message))
+        print("\nSolved in " + str(round(elapsed,3)) + " s")
+        ref = adjust(ref, rpm.objectives, "Reference level")
+
 
 def main():
-        # initialize
-        data, constraints, obj_opt, obj_i, constraint_values = init_problem()
-        
-        # company names, parameter preprocessing
-        names, par = params(data)
-        
-        # solve
-        solve_problem(par,names,obj_i,constraint_values,0.1)
-    
+    nb = int(input('Select your optimization method : \nEpsilon constraint method, press 1\
+          \nReference point method, press 2\n> '))
+    if nb == 1:
+        e_constraint_session()
+    else:
+        ref_point_session()
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import pytest
+import benchmark
+import dataset
+import service
+import solver
+
+"""
+Tests for answers of the service, with sessions built in this process and
+solved in a thread instead of worker processes.
+
+Run with:
+    python -m pytest test_service.py
+"""
+
+QUERY = json.dumps({'objective': 3, 'bounds': [0.05, 0.5, 1, 30]}).encode('utf-8')
+
+
+@pytest.fixture
+def synthetic(tmp_path, monkeypatch):
+    """
+    Universe of 1000 synthetic companies, some of which screening leaves out.
+    """
+
+    frame = benchmark.synthetic_universe(dataset.load('data/final_data.csv').frame(), 1000)
+    path = str(tmp_path / 'synthetic.csv')
+    frame.to_csv(path)
+    monkeypatch.setattr(solver, 'DATA_PATH', path)
+    return frame
+
+
+def query(screen):
+    """
+    Start sessions and answer QUERY through Service.respond.
+    """
+
+    ref = solver.RefPointSession(path=solver.DATA_PATH, use_cache=False)
+    service._init_worker(solver.B_TOL, screen, (ref.z_ideal, ref.z_nadir, ref.solutions))
+
+    async def respond():
+        with ThreadPoolExecutor(1) as pool:
+            svc = service.Service(pool, 1, 1, {})
+            svc.start()
+            answer = await svc.respond('POST', '/e-constraint', QUERY)
+            for task in svc.tasks:
+                task.cancel()
+            return answer
+
+    return asyncio.run(respond())
+
+
+def test_screened_e_constraint(synthetic):
+    status, answer, _ = query(screen=True)
+    assert len(service._sessions['e-constraint'].names) < len(synthetic)
+    assert status == 200 and answer['feasible']
+
+    # objectives and beta of the answer are those of the companies invested in
+    rows = synthetic.set_index('Company').loc[list(answer['weights'])]
+    w = np.array(list(answer['weights'].values()))
+    values = np.column_stack([rows['Expected return'], rows['ESG score'],
+                              rows['Dividend yield'],
+                              rows['Clean200']+rows['ScienceBasedTargets'], rows['P/E']])
+    np.testing.assert_allclose(answer['objectives'], w @ values, rtol=1e-5, atol=1e-8)
+    assert answer['beta'] == pytest.approx(w @ rows['Beta'].to_numpy(), rel=1e-5)
+
+
+def test_screening_keeps_optimum(synthetic):
+    _, screened, _ = query(screen=True)
+    _, full, _ = query(screen=False)
+    assert screened['objectives'][3] == pytest.approx(full['objectives'][3], rel=1e-6)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import io
+import pandas as pd
+import web_scraper
+
+"""
+Tests for extraction of the scrapers, run offline against the pages in data/.
+
+Run with:
+    python -m pytest test_web_scraper.py
+"""
+
+RANKING_SAMPLE = 'data/ranking_sample.html'
+LISTING_CSV = 'data/symbols_nasdaq_nordic.csv'
+
+
+def test_listing_matches_saved_symbols():
+    extracted = web_scraper.extract_listing(web_scraper.LISTING_PAGE)
+    expected = pd.read_csv(LISTING_CSV, keep_default_na=False)
+    pd.testing.assert_frame_equal(extracted, expected)
+
+
+def test_listing_small_chunks():
+    # fields split between chunks, and multi-byte characters split by chunks
+    with open(web_scraper.LISTING_PAGE, 'rb') as file:
+        parser = web_scraper.parse(web_scraper.ListingParser(), file, chunk_size=7)
+    expected = pd.read_csv(LISTING_CSV, keep_default_na=False)
+    assert parser.companies == expected['Name'].tolist()
+    assert parser.symbols == expected['Symbol'].tolist()
+
+
+def test_ranking_sample():
+    extracted = web_scraper.extract_ranking(RANKING_SAMPLE)
+    # items with a missing field are skipped, divs outside items are ignored
+    assert extracted['Company'].tolist() == [' 1&1 Drillisch AG ', ' 2U Inc ',
+                                             ' 3i Group PLC ', ' Åbo Ångström Oyj ']
+    assert extracted['ESG score'].tolist() == ['4', '9', '50', '77']
+
+
+def test_ranking_parser_chunked_equals_whole():
+    with open(RANKING_SAMPLE, 'rb') as file:
+        page = file.read()
+    for chunk_size in (1, 3, 64, len(page)):
+        parser = web_scraper.parse(web_scraper.RankingParser(), io.BytesIO(page), chunk_size)
+        assert parser.companies == [' 1&1 Drillisch AG ', ' 2U Inc ',
+                                    ' 3i Group PLC ', ' Åbo Ångström Oyj ']
+        assert parser.scores == ['4', '9', '50', '77']
+
+
+def test_ranking_text_source():
+    with open(RANKING_SAMPLE, encoding='utf-8') as file:
+        extracted = web_scraper.extract_ranking(io.StringIO(file.read()))
+    assert len(extracted) == 4
+
+
+def test_extract_pages_in_order():
+    paths = [RANKING_SAMPLE, RANKING_SAMPLE]
+    serial = web_scraper.extract_pages(paths, web_scraper.extract_ranking, workers=1)
+    parallel = web_scraper.extract_pages(paths, web_scraper.extract_ranking, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert len(parallel) == 8
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+import codecs
 import csv
+from html.parser import HTMLParser
 import pandas as pd
-import re
 import urllib.request
 
 """
@@ -15,59 +16,280 @@ Created on Fri Apr  3 20:51:17 2020
    See https://yearbook.robecosam.com/ranking/
    and http://www.nasdaqomxnordic.com/shares/listed-companies/nordic-large-cap
 2) Transforming ESG ranking data from three sources into csv-format.
+
+Pages are parsed incrementally, chunk by chunk as they are read or downloaded,
+without building a document tree: only the company/score and name/symbol fields
+are extracted. Saved pages can be processed concurrently with extract_pages.
 """
 
-# 1)
-# parsing the webpage with beautifulsoup
 #url = "https://yearbook.robecosam.com/ranking/"
-url = "https://www.spglobal.com/esg/csa/yearbook/ranking/"
-page = urllib.request.urlopen(url)
-soup = BeautifulSoup(page,features='html.parser')
-
-# for storing the values
-companies_sam = []
-scores_sam = []
-
-# extracting company names and esg scores
-for a in soup.findAll('div', attrs={'class':re.compile("mix item")}):
-    companies_sam.append(a.find('div', attrs={'class':'company'}).text)
-    scores_sam.append(a.find('div', attrs={'class':'percentile'}).text)
-    
-# parse nasdaq webpage
-page = open('data/Nordic Large Cap - Listed Companies - Nasdaq.html', 'r', encoding='utf-8')
-soup = BeautifulSoup(page,features='html.parser')
-
-companies = []
-symbols = []
-
-# extracting company names and symbols
-table = soup.find('table', attrs={'id':'listedCompanies'}).find('tbody')
-for t in table:
-    if (t != '\n'):
-        rows = t.findAll('td')
-        companies.append(rows[0].text) # first row, company name
-        symbols.append(rows[1].text) # second row, symbol
-        
-
-# 2)
-# storing the data in usable format
-df = pd.DataFrame({'Company':companies_sam, 'ESG score':scores_sam})
-df.to_csv(r'data\robecosam.csv',index=False,encoding='utf8')
-
-# storing the data in usable format
-df_nn = pd.DataFrame({'Name':companies, 'Symbol':symbols})
-df_nn.to_csv(r'data\symbols_nasdaq_nordic.csv',index=False,encoding='utf8')
-
-# convert excel files to csv
-clean200 = pd.read_excel(r'data\clean200.xlsx')
-clean200.to_csv(r'data\clean200.csv', index = None)
-sbt = pd.read_excel(r'data\sciencebasedtargets.xlsx')
-sbt.to_csv(r'data\sciencebasedtargets.csv', index = None)
-
-# extract company names from sciencebasedtargets list 
-# (only names, no scores or ratings included in rating)
-companies_sbt = [] 
-with open('data\sciencebasedtargets.csv', encoding='utf-8') as f:
-    r = csv.reader(f)
-    for row in r:
-        companies_sbt.append(row[0])        
\ No newline at end of file
+RANKING_URL = "https://www.spglobal.com/esg/csa/yearbook/ranking/"
+LISTING_PAGE = 'data/Nordic Large Cap - Listed Companies - Nasdaq.html'
+CHUNK_SIZE = 1 << 16
+
+
+class RankingParser(HTMLParser):
+    """
+    Extracts company names and ESG scores from the yearbook ranking page.
+
+    Each company is a div with class "mix item", including divs with classes
+    company and percentile.
+
+    Attributes
+    ----------
+    companies : list
+        company names.
+    scores : list
+        ESG scores, as text.
+
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.companies = []
+        self.scores = []
+        # depth of nested divs, and depths of current item and field
+        self._depth = 0
+        self._item = None
+        self._field = None
+        self._values = {}
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'div':
+            return
+        self._depth += 1
+        classes = dict(attrs).get('class') or ''
+        if self._item is None:
+            if 'mix item' in classes:
+                self._item = self._depth
+                self._values = {}
+        elif self._field is None:
+            for field in ('company', 'percentile'):
+                if field in classes.split() and field not in self._values:
+                    self._field = (field, self._depth)
+                    self._text = []
+
+    def handle_endtag(self, tag):
+        if tag != 'div':
+            return
+        if self._field is not None and self._field[1] == self._depth:
+            self._values[self._field[0]] = ''.join(self._text)
+            self._field = None
+        if self._item == self._depth:
+            if 'company' in self._values and 'percentile' in self._values:
+                self.companies.append(self._values['company'])
+                self.scores.append(self._values['percentile'])
+            self._item = None
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._field is not None:
+            self._text.append(data)
+
+
+class ListingParser(HTMLParser):
+    """
+    Extracts company names and symbols from the Nasdaq Nordic listing page.
+
+    Companies are rows of the body of table listedCompanies, name in the first
+    and symbol in the second cell.
+
+    Attributes
+    ----------
+    companies : list
+        company names.
+    symbols : list
+        stock symbols.
+
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.companies = []
+        self.symbols = []
+        # depth of nested tables, and depth of table listedCompanies
+        self._depth = 0
+        self._table = None
+        self._body = False
+        self._cells = None
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self._depth += 1
+            if self._table is None and dict(attrs).get('id') == 'listedCompanies':
+                self._table = self._depth
+        elif self._table != self._depth:
+            return
+        elif tag == 'tbody':
+            self._body = True
+        elif tag == 'tr' and self._body:
+            self._cells = []
+        elif tag == 'td' and self._cells is not None:
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            if self._table == self._depth:
+                self._table = None
+                self._body = False
+            self._depth -= 1
+        elif self._table != self._depth:
+            return
+        elif tag == 'tbody':
+            self._body = False
+        elif tag == 'td' and self._text is not None:
+            self._cells.append(''.join(self._text))
+            self._text = None
+        elif tag == 'tr' and self._cells is not None:
+            if len(self._cells) >= 2:
+                self.companies.append(self._cells[0]) # first cell, company name
+                self.symbols.append(self._cells[1]) # second cell, symbol
+            self._cells = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def parse(parser, source, chunk_size=CHUNK_SIZE):
+    """
+    Feed a document to a parser chunk by chunk.
+
+    Parameters
+    ----------
+    parser : html.parser.HTMLParser
+        parser, e.g. RankingParser or ListingParser.
+    source : str or file
+        path to file, or file-like object (e.g. response of urllib) of text or bytes.
+    chunk_size : int
+        size of chunks read.
+
+    Returns
+    -------
+    parser, after the whole document is fed.
+
+    """
+
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            return parse(parser, file, chunk_size)
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    return parser
+
+
+def extract_ranking(source):
+    """
+    Extract company names and ESG scores from the yearbook ranking page.
+
+    Parameters
+    ----------
+    source : str or file
+        path to saved page, or file-like object, see parse.
+
+    Returns
+    -------
+    DataFrame
+        columns Company and ESG score.
+
+    """
+
+    parser = parse(RankingParser(), source)
+    return pd.DataFrame({'Company':parser.companies, 'ESG score':parser.scores})
+
+
+def extract_listing(source):
+    """
+    Extract company names and stock symbols from the Nasdaq Nordic listing page.
+
+    Parameters
+    ----------
+    source : str or file
+        path to saved page, or file-like object, see parse.
+
+    Returns
+    -------
+    DataFrame
+        columns Name and Symbol.
+
+    """
+
+    parser = parse(ListingParser(), source)
+    return pd.DataFrame({'Name':parser.companies, 'Symbol':parser.symbols})
+
+
+def extract_pages(paths, extract, workers=None):
+    """
+    Extract data from multiple saved pages concurrently, in a process pool.
+
+    Parameters
+    ----------
+    paths : list
+        paths to saved pages.
+    extract : function
+        extract_ranking or extract_listing.
+    workers : int, optional
+        number of processes, by default number of CPUs.
+
+    Returns
+    -------
+    DataFrame
+        data extracted from all pages, in order of paths.
+
+    """
+
+    if len(paths) < 2 or workers == 1:
+        frames = [extract(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(extract, paths))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    """
+    Scrape ESG scores and Nasdaq Nordic symbols, and transform ranking data into csv.
+    """
+
+    # 1)
+    # parsing the webpage while it is downloaded
+    with urllib.request.urlopen(RANKING_URL) as page:
+        df = extract_ranking(page)
+
+    # parse nasdaq webpage
+    df_nn = extract_listing(LISTING_PAGE)
+
+    # 2)
+    # storing the data in usable format
+    df.to_csv('data/robecosam.csv',index=False,encoding='utf8')
+
+    # storing the data in usable format
+    df_nn.to_csv('data/symbols_nasdaq_nordic.csv',index=False,encoding='utf8')
+
+    # convert excel files to csv
+    clean200 = pd.read_excel('data/clean200.xlsx')
+    clean200.to_csv('data/clean200.csv', index = None)
+    sbt = pd.read_excel('data/sciencebasedtargets.xlsx')
+    sbt.to_csv('data/sciencebasedtargets.csv', index = None)
+
+    # extract company names from sciencebasedtargets list
+    # (only names, no scores or ratings included in rating)
+    companies_sbt = []
+    with open('data/sciencebasedtargets.csv', encoding='utf-8') as f:
+        r = csv.reader(f)
+        for row in r:
+            companies_sbt.append(row[0])
+    return companies_sbt
+
+
+if __name__ == '__main__':
+    main()